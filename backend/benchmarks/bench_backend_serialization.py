@@ -0,0 +1,82 @@
+"""
+Compara el coste de serializar el catalogo de backends.
+
+- ``legacy``: un ``Backend`` por documento, ``model_dump``, revalidacion
+  como ``list[dict]`` (``response_model``), ``jsonable_encoder`` y ``json.dumps``
+- ``single_pass``: ``TypeAdapter`` del tipo de backend y ``orjson``
+
+Uso (desde ``backend/``)::
+
+    python -m benchmarks.bench_backend_serialization [backends] [repeticiones]
+"""
+
+import datetime
+import json
+import sys
+import timeit
+
+import orjson
+from bson import ObjectId
+from fastapi.encoders import jsonable_encoder
+from pydantic import TypeAdapter
+
+from database.models.backends_models import (
+    Backend,
+    ClassType,
+    retrieve_backend,
+    serialize_backend,
+)
+
+response_adapter = TypeAdapter(list[dict])
+
+
+def make_document(i: int) -> dict:
+    """Synthetic backend document, like the ones stored in the database"""
+    class_type = list(ClassType)[i % len(ClassType)]
+    document = {
+        "_id": ObjectId(),
+        "class_type": class_type.value,
+        "provider": {"provider_id": ObjectId(), "provider_name": "Provider"},
+        "bid": f"provider.backend_{i}",
+        "backend_name": f"backend_{i}",
+        "qubits": 20 + i % 100,
+        "last_checked": datetime.datetime.now(),
+        "extra": ["qubits"],
+    }
+    if class_type != ClassType.RIGETTI:
+        document["status"] = "online"
+        document["queue"] = {"type": "jobs", "value": str(i % 50)}
+    if class_type == ClassType.IBM:
+        document["basis_gates"] = ["cx", "id", "rz", "sx", "x"]
+    if class_type == ClassType.BRAKET:
+        document["shots_range"] = {"min": 1, "max": 100000}
+        document["device_cost"] = {"price": 0.3, "unit": "task"}
+    return document
+
+
+def legacy(documents: list[dict]) -> bytes:
+    backends = [
+        retrieve_backend(Backend(backend=document), as_dict=True)
+        for document in documents
+    ]
+    content = jsonable_encoder(response_adapter.validate_python(backends))
+    return json.dumps(content).encode("utf-8")
+
+
+def single_pass(documents: list[dict]) -> bytes:
+    return orjson.dumps([serialize_backend(document) for document in documents])
+
+
+def main(size: int = 5000, repeat: int = 5):
+    documents = [make_document(i) for i in range(size)]
+    # Ambos caminos deben producir el mismo JSON
+    assert json.loads(legacy(documents)) == orjson.loads(single_pass(documents))
+
+    print(f"{size} backends, best of {repeat}")
+    for func in (legacy, single_pass):
+        best = min(timeit.repeat(lambda: func(documents), number=1, repeat=repeat))
+        print(f"  {func.__name__:<12} {best * 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:3]))
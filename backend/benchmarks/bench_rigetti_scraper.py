@@ -0,0 +1,63 @@
+"""
+Compara el scraper de Rigetti con esperas fijas y con esperas por condicion.
+
+- ``sleeps``: la version anterior (``implicitly_wait(10)`` + ``time.sleep(1)``
+  tras pulsar cada QPU)
+- ``waits``: ``get_backends`` con esperas explicitas
+- ``parallel``: ``get_backends`` repartiendo las QPUs entre varias sesiones
+
+Se ejecuta contra una copia local de https://qcs.rigetti.com/qpus guardada
+desde el navegador ("Guardar como... pagina web completa").
+
+Uso (desde ``backend/``)::
+
+    python -m benchmarks.bench_rigetti_scraper ruta/a/qpus.html [sesiones]
+"""
+
+import sys
+import time
+from pathlib import Path
+
+from modules.scraper_module import innit_driver
+from modules.source_files import rigetti_ws_code_v1 as rigetti
+from utils.webdriver_pool import webdriver_pool
+
+
+def sleeps(driver) -> list[dict]:
+    driver.implicitly_wait(10)
+    try:
+        output = [rigetti.get_page_info(driver)]
+        for element in rigetti.find_qpu_buttons(driver)[1:]:
+            element.click()
+            time.sleep(1)
+            output.append(rigetti.get_page_info(driver))
+        return output
+    finally:
+        driver.implicitly_wait(0)
+
+
+def waits(driver) -> list[dict]:
+    return rigetti.get_backends(driver, sessions=1)
+
+
+def main(path: str, sessions: int = 2):
+    url = Path(path).resolve().as_uri()
+    parallel = lambda driver: rigetti.get_backends(driver, sessions=sessions)
+    results = {}
+    for name, func in [("sleeps", sleeps), ("waits", waits), ("parallel", parallel)]:
+        with innit_driver(url) as driver:
+            if not driver:
+                sys.exit("No webdriver available")
+            start = time.perf_counter()
+            results[name] = func(driver)
+            elapsed = time.perf_counter() - start
+        print(f"{name:<9} {elapsed:6.2f} s  ({len(results[name])} QPUs)")
+    # Todas las estrategias deben leer lo mismo
+    assert results["sleeps"] == results["waits"] == results["parallel"]
+    webdriver_pool.close()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        sys.exit(__doc__)
+    main(sys.argv[1], *map(int, sys.argv[2:3]))
@@ -0,0 +1,59 @@
+"""
+Comprueba que el circuit breaker se abre cuando la API key de IBM no es
+valida: los primeros ``CIRCUIT_FAILURE_THRESHOLD`` refrescos fallan al
+autenticarse (el error llega al breaker) y el siguiente ya no llama a IBM.
+
+Usa un circuito de prueba en la base de datos configurada, que se borra al
+terminar, y no envia correos.
+
+Uso (desde ``backend/``)::
+
+    python -m checks.check_circuit_breaker
+"""
+
+import sys
+from types import SimpleNamespace
+
+from database.mongo_client import circuits_coll
+from modules.gateway_module import TIER_FULL, circuit_call, provider_circuit
+from modules.module_loader import module_loader
+from utils import circuit_breaker
+from utils.circuit_breaker import CIRCUIT_FAILURE_THRESHOLD, CircuitOpenError
+
+
+def invalid_key(request, *, provider_key: str):
+    raise ValueError("ApiKeys not found in dummy account")
+
+
+def main():
+    ibm = module_loader.require("ibm_api_code")
+    ibm.get_auth_if_needed = invalid_key
+    mails = []
+    circuit_breaker.send_error_mail = lambda error, message: mails.append(message)
+
+    provider = SimpleNamespace(pid="check-ibm-auth")
+    request = SimpleNamespace(base_url="https://api.quantum-computing.ibm.com/api")
+    circuit_id = provider_circuit(provider, TIER_FULL).circuit_id
+    circuits_coll.delete_one({"_id": circuit_id})
+    try:
+        for _ in range(CIRCUIT_FAILURE_THRESHOLD):
+            try:
+                with circuit_call(provider, TIER_FULL):
+                    ibm.get_backends(request)
+            except ValueError:
+                continue
+            sys.exit("The auth error did not reach the circuit breaker")
+
+        try:
+            with circuit_call(provider, TIER_FULL):
+                sys.exit("The circuit did not open")
+        except CircuitOpenError as e:
+            print(f"OK: {e}")
+        # Un solo correo por caida
+        assert len(mails) == 1, mails
+    finally:
+        circuits_coll.delete_one({"_id": circuit_id})
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,327 @@
+from bson import ObjectId
+from motor.motor_asyncio import (
+    AsyncIOMotorClient,
+    AsyncIOMotorCollection,
+    AsyncIOMotorCursor,
+)
+from pymongo import ReturnDocument
+from utils.metrics import db_command_metrics
+
+from database.mongo_client import DB_PORT, DB_URI, config
+
+# Contraparte asíncrona de 'mongo_client', para usar desde las rutas 'async def'.
+# Un único cliente por proceso: motor mantiene su propio pool de conexiones,
+# así que todas las peticiones concurrentes lo comparten sin bloquear el event loop.
+# Solo tiene las funciones de las rutas 'async def': las de usuarios y cuentas son
+# 'def' (se ejecutan en el threadpool) y siguen usando 'mongo_client'.
+
+DB_MAX_POOL_SIZE = int(config.get("DB_MAX_POOL_SIZE", 100))
+DB_MIN_POOL_SIZE = int(config.get("DB_MIN_POOL_SIZE", 0))
+
+# Async client for the database
+async_db_client = AsyncIOMotorClient(
+    DB_URI,
+    int(DB_PORT),
+    maxPoolSize=DB_MAX_POOL_SIZE,
+    minPoolSize=DB_MIN_POOL_SIZE,
+    event_listeners=[db_command_metrics],
+)
+
+# Available databases
+db_prod = async_db_client["quantum-proxy-db"]
+
+# Collections
+providers_coll = db_prod.providers
+backends_coll = db_prod.backends
+users_coll = db_prod.users
+refresh_runs_coll = db_prod.refresh_runs
+meta_coll = db_prod.meta
+job_runs_coll = db_prod.job_runs
+
+# region Misc ----------------------------
+
+
+def get_collection(collection: str) -> AsyncIOMotorCollection:
+    """
+    Get a collection by its name.
+    :param collection: <str> name of the collection
+    :raises ValueError: if the collection is not exposed
+    """
+    coll = {
+        "providers": providers_coll,
+        "backends": backends_coll,
+        "users": users_coll,
+    }.get(collection, None)
+    if coll is None:
+        raise ValueError(f"Collection '{collection}' not found")
+    return coll
+
+
+# check if a collection is empty
+async def is_empty(collection: str) -> bool:
+    coll = get_collection(collection)
+    return await coll.count_documents({}, limit=1) == 0
+
+
+# count the number of documents in a collection
+async def count_documents(collection: str) -> int:
+    """
+    Count the number of documents in a collection.
+    :param collection: <str> collection to count
+    :return: <int> number of documents in the collection
+    """
+    coll = get_collection(collection)
+    return await coll.count_documents({})
+
+
+# region Generic ----------------------------
+
+
+async def aggregate(*, collection: str, pipeline: list[dict]) -> list[dict]:
+    """
+    Perform an aggregation on the collection.
+    :param ``collection``: collection on which to aggregate
+    :param ``pipeline``: list of aggregation stages
+    """
+    coll = get_collection(collection)
+    return await coll.aggregate(pipeline).to_list(length=None)
+
+
+async def db_find_one(
+    collection: AsyncIOMotorCollection,
+    *,
+    filter: ObjectId | dict = None,
+    projection: dict = {},
+) -> dict:
+    """
+    Get the document matching the id or query a document.
+    :param ``collection``: collection from which to query
+    :param ``filter`` (optional): a dictionary specifying the query to be performed
+    OR any other type to be used as the value for a query for ``"_id"``
+    :param ``projection`` (optional): fields to include or exclude in the result
+    """
+    if isinstance(filter, (ObjectId, dict)):
+        return await collection.find_one(filter, projection)
+    return None
+
+
+async def db_find_many(
+    collection: AsyncIOMotorCollection, *, filter: dict = {}, projection: dict = {}
+) -> list[dict]:
+    """
+    Get all documents matching the filter.
+    :param ``collection``: collection from which to query
+    :param ``filter`` (optional): a dictionary specifying the query to be performed
+    :param ``projection`` (optional): fields to include or exclude in the result
+    """
+    cursor: AsyncIOMotorCursor = collection.find(filter, projection)
+    return await cursor.to_list(length=None)
+
+
+async def db_insert_one(collection: AsyncIOMotorCollection, document: dict) -> str:
+    """
+    Insert a new document into the database.
+    :param ``collection``: collection in which to insert
+    :param ``document``: dict
+    :return: Inserted ID (str)
+    """
+    return (await collection.insert_one(document)).inserted_id
+
+
+async def db_insert_many(
+    collection: AsyncIOMotorCollection, documents: list[dict]
+) -> list[str]:
+    """
+    Insert a list of documents into the database.
+    :param ``collection``: collection in which to insert
+    :param ``documents``: list of dicts
+    :return: List of inserted IDs (list[str])
+    """
+    return (await collection.insert_many(documents)).inserted_ids
+
+
+async def db_update_one(
+    collection: AsyncIOMotorCollection, *, filter: dict, cambios: dict
+):
+    """
+    Updates a single document matching the filter.
+    :param ``collection``: collection in which to update
+    :param filter: query document
+    :param cambios: dict with the changes to apply
+    """
+    return await collection.find_one_and_update(
+        filter, cambios, return_document=ReturnDocument.AFTER
+    )
+
+
+async def db_update_many(
+    collection: AsyncIOMotorCollection, *, filter: dict, cambios: dict
+):
+    """
+    Updates all documents matching the filter.
+    :param ``collection``: collection in which to update
+    :param filter: query document
+    :param cambios: dict with the changes to apply
+    """
+    return await collection.update_many(filter, cambios)
+
+
+async def db_replace_one(
+    collection: AsyncIOMotorCollection, *, filter: dict, replacement: dict, **kwargs
+) -> dict:
+    """
+    Replaces a single document matching the filter.
+    :param ``collection``: collection in which to replace
+    :param filter: query document
+    :param replacement: document to replace
+    """
+    return await collection.find_one_and_replace(
+        filter, replacement, kwargs, return_document=ReturnDocument.AFTER
+    )
+
+
+async def db_delete_one(collection: AsyncIOMotorCollection, *, filter: dict) -> bool:
+    """
+    Deletes a single document matching the filter.
+    :param ``collection``: collection in which to delete
+    :param filter: query document
+    :return: True if the document was deleted, False otherwise
+    """
+    return (await collection.delete_one(filter)).deleted_count == 1
+
+
+async def db_delete_many(collection: AsyncIOMotorCollection, *, filter: dict) -> bool:
+    """
+    Deletes all documents matching the filter.
+    :param ``collection``: collection in which to delete
+    :param filter: query document
+    :return: True if at least one document was deleted, False otherwise
+    """
+    return (await collection.delete_many(filter)).deleted_count > 0
+
+
+# region Providers ----------------------------
+
+
+async def db_find_provider(
+    *, filter: ObjectId | dict = None, projection: dict = {}
+) -> dict:
+    """
+    Get the provider matching the id or query a document.
+    :param ``filter`` (optional): a dictionary specifying the query to be performed
+    OR any other type to be used as the value for a query for ``"_id"``
+    :param ``projection`` (optional): fields to include or exclude in the result
+    """
+    return await db_find_one(providers_coll, filter=filter, projection=projection)
+
+
+async def db_find_providers(*, filter: dict = {}, projection: dict = {}) -> list[dict]:
+    """
+    Get all providers that match the filter.
+    :param filter: query document
+    """
+    return await db_find_many(providers_coll, filter=filter, projection=projection)
+
+
+async def db_insert_provider(provider) -> str:
+    """
+    Insert a new provider into the database.
+    :param provider: dict
+    :return: Inserted ID (str)
+    """
+    return await db_insert_one(providers_coll, provider)
+
+
+async def db_update_provider(*, filter: dict, cambios: dict):
+    """
+    Updates a single provider matching the filter.
+    :param filter: provider query
+    :param cambios: dict with the changes to apply
+    """
+    return await db_update_one(providers_coll, filter=filter, cambios=cambios)
+
+
+async def db_replace_provider(*, filter: dict, replacement: dict) -> dict:
+    """
+    Replaces a single provider matching the filter.
+    :param filter: provider query
+    :param replacement: provider to replace
+    """
+    return await db_replace_one(providers_coll, filter=filter, replacement=replacement)
+
+
+async def db_delete_provider(*, filter: dict) -> bool:
+    """
+    Deletes a single provider matching the filter.
+    :param filter: provider query
+    """
+    return await db_delete_one(providers_coll, filter=filter)
+
+
+# region Backends ----------------------------
+
+
+async def db_find_backend(
+    *, filter: ObjectId | dict = None, projection: dict = {}
+) -> dict:
+    """
+    Get the backend matching the id or query a document.
+    :param ``filter`` (optional): a dictionary specifying the query to be performed
+    OR any other type to be used as the value for a query for ``"_id"``
+    :param ``projection`` (optional): fields to include or exclude in the result
+    """
+    if projection:
+        projection.update({"class_type": 1})
+    return await db_find_one(backends_coll, filter=filter, projection=projection)
+
+
+async def db_find_backends(*, filter: dict = {}, projection: dict = {}) -> list[dict]:
+    """
+    Get all backends that match the filter.
+    :param filter: query document
+    """
+    if projection:
+        projection.update({"class_type": 1})
+    return await db_find_many(backends_coll, filter=filter, projection=projection)
+
+
+# region Refresh runs ----------------------------
+
+
+async def db_find_refresh_run(
+    *, filter: ObjectId | dict = None, projection: dict = {}
+) -> dict:
+    """
+    Get the refresh run matching the id or query a document.
+    :param ``filter`` (optional): a dictionary specifying the query to be performed
+    OR any other type to be used as the value for a query for ``"_id"``
+    :param ``projection`` (optional): fields to include or exclude in the result
+    """
+    return await db_find_one(refresh_runs_coll, filter=filter, projection=projection)
+
+
+async def db_find_latest_refresh_runs(
+    *, filter: dict = {}, projection: dict = {}, limit: int
+) -> list[dict]:
+    """
+    Get the most recent refresh runs matching the filter.
+    :param ``filter`` (optional): a dictionary specifying the query to be performed
+    :param ``projection`` (optional): fields to include or exclude in the result
+    :param ``limit``: max number of runs
+    """
+    cursor: AsyncIOMotorCursor = (
+        refresh_runs_coll.find(filter, projection).sort("created_at", -1).limit(limit)
+    )
+    return await cursor.to_list(length=None)
+
+
+# region Scheduler jobs ----------------------------
+
+
+async def db_find_job_runs(*, filter: dict = {}, projection: dict = {}) -> list[dict]:
+    """
+    Get the last and next run of the scheduled jobs.
+    :param ``filter`` (optional): a dictionary specifying the query to be performed
+    :param ``projection`` (optional): fields to include or exclude in the result
+    """
+    return await db_find_many(job_runs_coll, filter=filter, projection=projection)
@@ -0,0 +1,177 @@
+"""
+Cache en memoria del catalogo de backends.
+
+El catalogo solo cambia cuando se refresca, asi que las lecturas se sirven
+desde memoria. Cada escritura incrementa la version del catalogo guardada
+en la base de datos (``invalidate_catalog``) y los workers, que la consultan
+como mucho cada ``CATALOG_CHECK_INTERVAL`` segundos, recargan el catalogo
+completo cuando cambia y lo sustituyen de forma atomica.
+"""
+
+import asyncio
+import threading
+import time
+
+import orjson
+from database.async_mongo_client import backends_coll as async_backends_coll
+from database.async_mongo_client import meta_coll as async_meta_coll
+from database.models.backends_models import serialize_backend
+from database.mongo_client import config, meta_coll
+
+CATALOG_ID = "backends_catalog"
+# Cada cuantos segundos se comprueba si otro proceso ha cambiado el catalogo
+CATALOG_CHECK_INTERVAL = float(config.get("CATALOG_CHECK_INTERVAL", 5))
+
+
+class UnsupportedQuery(Exception):
+    """The filter or projection can't be resolved from memory"""
+
+
+class CatalogSnapshot:
+    """Immutable view of the catalog at a given version"""
+
+    def __init__(self, version: int, documents: list[dict]):
+        self.version = version
+        self.documents = documents
+        self.backends = [serialize_backend(document) for document in documents]
+        # El catalogo completo ya codificado, listo para enviarse
+        self.encoded: bytes = orjson.dumps(self.backends)
+        self.by_bid = {
+            document["bid"]: backend
+            for document, backend in zip(documents, self.backends)
+            if "bid" in document
+        }
+
+
+class BackendCatalog:
+    """Versioned read-through cache of the ``backends`` collection"""
+
+    def __init__(self):
+        self.snapshot: CatalogSnapshot = None
+        self.checked_at = 0.0
+        # Lo activan las escrituras de este mismo proceso, para no esperar
+        self.invalidated = threading.Event()
+        self.reload_lock = asyncio.Lock()
+
+    async def get_version(self) -> int:
+        document = await async_meta_coll.find_one({"_id": CATALOG_ID})
+        return document["version"] if document else 0
+
+    async def get(self) -> CatalogSnapshot:
+        """The current snapshot, reloaded first if the catalog has changed"""
+        if self.is_fresh():
+            return self.snapshot
+        async with self.reload_lock:
+            # Otra peticion puede haberlo recargado mientras se esperaba
+            if self.is_fresh():
+                return self.snapshot
+            self.invalidated.clear()
+            version = await self.get_version()
+            if self.snapshot is None or self.snapshot.version != version:
+                documents = await async_backends_coll.find({}).to_list(length=None)
+                self.snapshot = CatalogSnapshot(version, documents)
+            self.checked_at = time.monotonic()
+        return self.snapshot
+
+    def is_fresh(self) -> bool:
+        return (
+            self.snapshot is not None
+            and not self.invalidated.is_set()
+            and time.monotonic() - self.checked_at < CATALOG_CHECK_INTERVAL
+        )
+
+
+backend_catalog = BackendCatalog()
+
+
+def invalidate_catalog():
+    """
+    Marks the catalog as changed for every worker.
+    Must be called after every write to the ``backends`` collection.
+    """
+    meta_coll.update_one({"_id": CATALOG_ID}, {"$inc": {"version": 1}}, upsert=True)
+    backend_catalog.invalidated.set()
+
+
+# region Queries ----------------------------
+
+
+def get_field(document: dict, path: str):
+    """Value of a (dotted) field of a document, None if it doesn't exist"""
+    value = document
+    for key in path.split("."):
+        if not isinstance(value, dict):
+            return None
+        value = value.get(key)
+    return value
+
+
+def matches_value(value, expected) -> bool:
+    """Equality as MongoDB does it (an array matches if it contains the value)"""
+    if isinstance(value, list) and not isinstance(expected, list):
+        return expected in value
+    return value == expected
+
+
+def matches(document: dict, filter: dict) -> bool:
+    """
+    Whether a document matches the filter. Only equality and ``$in``
+    are supported, anything else raises ``UnsupportedQuery``.
+    """
+    for path, expected in filter.items():
+        if path.startswith("$"):
+            raise UnsupportedQuery(path)
+        value = get_field(document, path)
+        if isinstance(expected, dict) and any(key.startswith("$") for key in expected):
+            if expected.keys() != {"$in"}:
+                raise UnsupportedQuery(path)
+            if not any(matches_value(value, option) for option in expected["$in"]):
+                return False
+        elif not matches_value(value, expected):
+            return False
+    return True
+
+
+def project(backend: dict, projection: dict) -> dict:
+    """
+    Apply a projection to a serialized backend. Only top level fields
+    are supported, anything else raises ``UnsupportedQuery``.
+    """
+    if not projection:
+        return backend
+    if any("." in field for field in projection):
+        raise UnsupportedQuery("projection")
+    # '_id' se serializa como 'id'
+    fields = {
+        ("id" if field == "_id" else field): bool(value)
+        for field, value in projection.items()
+    }
+    included = {field for field, value in fields.items() if value and field != "id"}
+    if included:
+        included.update({"id"} if fields.get("id", True) else set())
+        return {field: value for field, value in backend.items() if field in included}
+    return {field: value for field, value in backend.items() if fields.get(field, True)}
+
+
+def find_in_catalog(
+    snapshot: CatalogSnapshot, *, filter: dict = {}, projection: dict = {}
+) -> list[dict]:
+    """
+    Resolve a query from memory.
+    :raises UnsupportedQuery: if the query must be resolved by the database
+    """
+    return [
+        project(backend, projection)
+        for document, backend in zip(snapshot.documents, snapshot.backends)
+        if matches(document, filter)
+    ]
+
+
+def find_by_bid(snapshot: CatalogSnapshot, bid: str, projection: dict = {}) -> dict:
+    """
+    Get a backend by its bid from memory, None if it doesn't exist.
+    :raises UnsupportedQuery: if the projection is not supported
+    """
+    if (backend := snapshot.by_bid.get(bid)) is None:
+        return None
+    return project(backend, projection)
@@ -0,0 +1,136 @@
+"""
+Registro declarativo de los índices de la base de datos.
+
+- ``INDEXES``: índices que deben existir en cada colección
+- ``check_indexes``: compara el registro con los índices existentes
+- ``ensure_indexes``: crea los índices que falten (se llama al arrancar la app)
+"""
+
+from fastapi.logger import logger
+from pymongo import ASCENDING, IndexModel
+from pymongo.collection import Collection
+from pymongo.errors import OperationFailure
+
+from database.mongo_client import (
+    backends_coll,
+    providers_coll,
+    refresh_runs_coll,
+    users_coll,
+)
+
+INDEXES: dict[str, list[IndexModel]] = {
+    "providers": [
+        IndexModel([("pid", ASCENDING)], name="pid_unique", unique=True),
+        IndexModel([("name", ASCENDING)], name="name"),
+        IndexModel([("from_third_party", ASCENDING)], name="from_third_party"),
+        IndexModel(
+            [("third_party.third_party_name", ASCENDING)], name="third_party_name"
+        ),
+    ],
+    "backends": [
+        IndexModel([("bid", ASCENDING)], name="bid_unique", unique=True),
+        IndexModel([("provider.provider_id", ASCENDING)], name="provider_id"),
+    ],
+    "users": [
+        IndexModel([("email", ASCENDING)], name="email_unique", unique=True),
+        IndexModel(
+            [("verification_token", ASCENDING)], name="verification_token", sparse=True
+        ),
+        IndexModel([("reset_token", ASCENDING)], name="reset_token", sparse=True),
+    ],
+    "refresh_runs": [
+        # Para unirse a un refresco en curso de los mismos proveedores
+        IndexModel([("key", ASCENDING), ("status", ASCENDING)], name="key_status"),
+        # Un solo refresco en curso por conjunto de proveedores, entre todos los workers
+        IndexModel(
+            [("key", ASCENDING)],
+            name="key_running_unique",
+            unique=True,
+            partialFilterExpression={"status": "running"},
+        ),
+        # Los refrescos antiguos se eliminan pasados 30 dias
+        IndexModel(
+            [("created_at", ASCENDING)],
+            name="created_at_ttl",
+            expireAfterSeconds=30 * 24 * 60 * 60,
+        ),
+    ],
+}
+
+COLLECTIONS: dict[str, Collection] = {
+    "providers": providers_coll,
+    "backends": backends_coll,
+    "users": users_coll,
+    "refresh_runs": refresh_runs_coll,
+}
+
+
+def get_index_usage(collection: Collection) -> dict[str, int]:
+    """
+    Number of operations that used each index since the server started.
+    :param collection: collection to inspect
+    :return: dict {index_name: ops}, empty if '$indexStats' is not allowed
+    """
+    try:
+        return {
+            stats["name"]: stats["accesses"]["ops"]
+            for stats in collection.aggregate([{"$indexStats": {}}])
+        }
+    except OperationFailure as error:
+        logger.warning(f"Could not read index stats of '{collection.name}': {error}")
+        return {}
+
+
+def check_indexes() -> dict[str, dict[str, list[str]]]:
+    """
+    Compare the registry against the indexes present in the database.
+    :return: for every collection, the indexes that are ``missing``,
+    the ones that were never used (``unused``) and the ones not declared
+    in the registry (``unregistered``)
+    """
+    report = {}
+    for name, index_models in INDEXES.items():
+        collection = COLLECTIONS[name]
+        existing: dict = collection.index_information()
+        declared = {model.document["name"] for model in index_models}
+        usage = get_index_usage(collection)
+        report[name] = {
+            "missing": sorted(declared - existing.keys()),
+            "unused": sorted(
+                index for index, ops in usage.items() if ops == 0 and index != "_id_"
+            ),
+            "unregistered": sorted(existing.keys() - declared - {"_id_"}),
+        }
+    return report
+
+
+def ensure_indexes() -> dict[str, dict[str, list[str]]]:
+    """
+    Create the indexes of the registry that do not exist yet.
+    Failures (e.g. duplicated values on a unique index) are logged and
+    reported under ``failed`` instead of stopping the start up.
+    :return: the report of ``check_indexes`` after the creation
+    """
+    failed: dict[str, list[str]] = {}
+    for name, index_models in INDEXES.items():
+        collection = COLLECTIONS[name]
+        existing: dict = collection.index_information()
+        for model in index_models:
+            index_name = model.document["name"]
+            if index_name in existing:
+                continue
+            try:
+                collection.create_indexes([model])
+                logger.debug(f"Index '{index_name}' created on '{name}'")
+            except OperationFailure as error:
+                logger.error(f"Index '{index_name}' on '{name}' failed: {error}")
+                failed.setdefault(name, []).append(index_name)
+
+    report = check_indexes()
+    for name, index_report in report.items():
+        index_report["failed"] = failed.get(name, [])
+        if index_report["missing"] or index_report["failed"]:
+            logger.warning(f"Index report for '{name}': {index_report}")
+        else:
+            logger.debug(f"Index report for '{name}': {index_report}")
+    return report
@@ -2,7 +2,7 @@ import datetime
 from enum import StrEnum
 from typing import Annotated, Literal, Optional
 
-from pydantic import BaseModel, BeforeValidator, ConfigDict, Field
+from pydantic import BaseModel, BeforeValidator, ConfigDict, Field, TypeAdapter
 
 PyObjectId = Annotated[str, BeforeValidator(str)]
 
@@ -135,3 +135,19 @@ def retrieve_backend(backend: Backend, as_dict=False):
     if as_dict:
         return real_backend.model_dump(exclude_none=True)
     return real_backend
+
+
+# Validador del tipo de backend, construido una sola vez
+backend_adapter = TypeAdapter(
+    Annotated[BackendType, Field(discriminator="class_type")]
+)
+
+
+def serialize_backend(document: dict) -> dict:
+    """
+    Validate a backend document and dump it as the API returns it
+    (same output as ``retrieve_backend(Backend(backend=...), as_dict=True)``)
+    """
+    return backend_adapter.dump_python(
+        backend_adapter.validate_python(document), exclude_none=True
+    )
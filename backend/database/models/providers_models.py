@@ -29,6 +29,8 @@ class Module(BaseModel):
     description: Optional[str] = None
     module_file: str
     func_to_eval: str
+    # Funcion (opcional) que solo obtiene el estado y la cola de los backends
+    status_func: Optional[str] = None
 
 
 class ScraperRequest(BaseModel):
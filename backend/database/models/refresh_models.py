@@ -0,0 +1,58 @@
+import datetime
+from typing import Annotated, Literal, Optional
+
+from pydantic import BaseModel, BeforeValidator, ConfigDict, Field
+
+PyObjectId = Annotated[str, BeforeValidator(str)]
+
+# "skipped": el proveedor esta fallando y no se le ha llamado (circuit breaker)
+RefreshStatus = Literal["pending", "running", "ok", "error", "timeout", "skipped"]
+
+# "abandoned": caduco sin terminar y otro refresco de los mismos proveedores lo relevo
+RunStatus = Literal["running", "finished", "abandoned"]
+
+
+class ProviderRefreshResult(BaseModel):
+    """
+    Resultado del refresco de los backends de un proveedor.
+    """
+
+    provider_id: str
+    provider_name: str
+    status: RefreshStatus = Field(default="pending")
+    backends: Optional[int] = Field(default=None)
+    error: Optional[str] = Field(default=None)
+    started_at: Optional[datetime.datetime] = Field(default=None)
+    duration: Optional[float] = Field(default=None)
+    # Segundos de cada etapa: module_load, fetch, normalize, db_write
+    stages: dict[str, float] = Field(default={})
+    # Backends obtenidos (fetched), normalizados y con errores
+    counts: dict[str, int] = Field(default={})
+    bytes_fetched: Optional[int] = Field(default=None)
+    # Los primeros errores de normalizacion
+    errors: list[str] = Field(default=[])
+
+
+class RefreshRunModel(BaseModel):
+    """
+    Ejecución del motor de refresco sobre un conjunto de proveedores.
+    """
+
+    id: Optional[PyObjectId] = Field(
+        validation_alias="_id", serialization_alias="id", default=None
+    )
+    # Identifica el conjunto de proveedores, para unir peticiones concurrentes
+    key: str
+    trigger: Literal["api", "scheduler"]
+    status: RunStatus = Field(default="running")
+    providers: list[ProviderRefreshResult] = Field(default=[])
+    created_at: Optional[datetime.datetime] = Field(default=None)
+    # A partir de esta fecha un refresco "running" se da por abandonado
+    expires_at: Optional[datetime.datetime] = Field(default=None)
+    finished_at: Optional[datetime.datetime] = Field(default=None)
+    duration: Optional[float] = Field(default=None)
+    # Segundos de las etapas del refresco completo (pricing)
+    stages: dict[str, float] = Field(default={})
+    # Fencing token del lider que lanzo el refresco (solo los del scheduler)
+    fencing_token: Optional[int] = Field(default=None)
+    model_config = ConfigDict(populate_by_name=True)
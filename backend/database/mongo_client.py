@@ -1,11 +1,14 @@
 import os
 from bson import ObjectId
 from dotenv import dotenv_values
-from pymongo import MongoClient, ReturnDocument
+from pymongo import MongoClient, ReplaceOne, ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from pymongo.results import BulkWriteResult
 from pymongo.collection import Collection
 from pymongo.cursor import Cursor
 
 from security.aes_cipher import decrypt_data, encrypt_data
+from utils.metrics import db_command_metrics
 
 # Cuidado con variables de entorno.
 # Avisar al usuario de que debe tener un archivo .env
@@ -19,7 +22,8 @@ if not (DB_URI := config.get("DB_URI")):
 DB_PORT = config.get("DB_PORT", 27017)
 
 # Client for the database
-db_client = MongoClient(DB_URI, int(DB_PORT))
+# Todos los comandos se miden (ver 'utils.metrics')
+db_client = MongoClient(DB_URI, int(DB_PORT), event_listeners=[db_command_metrics])
 
 # Available databases
 db_test = db_client["test-database"]
@@ -32,6 +36,11 @@ providers_coll = db_prod.providers
 backends_coll = db_prod.backends
 characts_coll = db_prod.characts
 users_coll = db_prod.users
+refresh_runs_coll = db_prod.refresh_runs
+meta_coll = db_prod.meta
+pricing_coll = db_prod.pricing
+job_runs_coll = db_prod.job_runs
+circuits_coll = db_prod.circuit_breakers
 
 # region Misc ----------------------------
 
@@ -171,6 +180,21 @@ def db_replace_one(
     )
 
 
+def db_bulk_write(
+    collection: Collection, operations: list, *, ordered: bool = True
+) -> BulkWriteResult:
+    """
+    Apply a list of write operations in a single round trip.
+    :param ``collection``: collection in which to write
+    :param operations: list of ``InsertOne``, ``UpdateOne``, ``ReplaceOne``, ...
+    :param ordered: stop at the first error (True) or apply them all (False)
+    :return: The result of the bulk write, None if there was nothing to write
+    """
+    if not operations:
+        return None
+    return collection.bulk_write(operations, ordered=ordered)
+
+
 def db_delete_one(collection: Collection, *, filter: dict) -> bool:
     """
     Deletes a single document matching the filter.
@@ -278,7 +302,7 @@ def db_aggregate_providers(*, pipeline: list[dict]) -> Cursor:
     Perform an aggregation on the providers collection.
     :param pipeline: list of aggregation stages
     """
-    return aggregate(providers_coll, pipeline=pipeline)
+    return providers_coll.aggregate(pipeline)
 
 
 def db_insert_provider(provider) -> str:
@@ -317,6 +341,14 @@ def db_update_providers(*, filter: dict, cambios: dict):
     return db_update_many(providers_coll, filter=filter, cambios=cambios)
 
 
+def db_bulk_write_providers(operations: list, *, ordered: bool = True):
+    """
+    Apply a list of write operations on the providers in a single round trip.
+    :param operations: list of write operations
+    """
+    return db_bulk_write(providers_coll, operations, ordered=ordered)
+
+
 def db_replace_provider(*, filter: dict, replacement: dict) -> dict:
     """
     Replaces a single provider matching the filter.
@@ -403,6 +435,14 @@ def db_update_backends(*, filter: dict, cambios: dict):
     return db_update_many(backends_coll, filter=filter, cambios=cambios)
 
 
+def db_bulk_write_backends(operations: list, *, ordered: bool = True):
+    """
+    Apply a list of write operations on the backends in a single round trip.
+    :param operations: list of write operations
+    """
+    return db_bulk_write(backends_coll, operations, ordered=ordered)
+
+
 def db_delete_backend(*, filter: dict) -> bool:
     """
     Deletes a single backend matching the filter.
@@ -419,6 +459,233 @@ def db_delete_backends(*, filter: dict) -> bool:
     return db_delete_many(backends_coll, filter=filter)
 
 
+# region Characterizations ----------------------------
+
+
+def db_find_characterizations(*, filter: dict = {}, projection: dict = {}) -> Cursor:
+    """
+    Get all characterizations that match the filter.
+    :param filter: query document
+    """
+    return db_find_many(characts_coll, filter=filter, projection=projection)
+
+
+def db_upsert_characterizations(characterizations: list[dict]):
+    """
+    Insert or replace (matching by ``_id``) a list of characterizations.
+    :param characterizations: list of dicts, each one with its ``_id``
+    """
+    return db_bulk_write(
+        characts_coll,
+        [
+            ReplaceOne({"_id": charact["_id"]}, charact, upsert=True)
+            for charact in characterizations
+        ],
+    )
+
+
+# region Pricing ----------------------------
+
+
+def db_find_pricing(source: str) -> dict:
+    """
+    Get the pricing snapshot of a source, None if it was never fetched.
+    :param source: the id of the pricing source
+    """
+    return db_find_one(pricing_coll, filter={"_id": source})
+
+
+def db_update_pricing(source: str, cambios: dict):
+    """
+    Update (or create) the pricing snapshot of a source.
+    :param source: the id of the pricing source
+    :param cambios: dict with the changes to apply
+    """
+    return pricing_coll.update_one({"_id": source}, cambios, upsert=True)
+
+
+def db_acquire_pricing_lease(source: str, *, owner: str, now, until) -> bool:
+    """
+    Take the lease to refresh the pricing of a source,
+    if nobody holds it or it has expired.
+    :return: whether the lease was acquired
+    """
+    try:
+        pricing_coll.update_one(
+            {
+                "_id": source,
+                "$or": [{"lease": None}, {"lease.until": {"$lt": now}}],
+            },
+            {"$set": {"lease": {"owner": owner, "until": until}}},
+            upsert=True,
+        )
+        return True
+    except DuplicateKeyError:
+        # El documento existe y otro proceso tiene el lease
+        return False
+
+
+def db_release_pricing_lease(source: str, *, owner: str):
+    """Release the lease to refresh the pricing of a source, if still held"""
+    pricing_coll.update_one(
+        {"_id": source, "lease.owner": owner}, {"$unset": {"lease": ""}}
+    )
+
+
+# region Leases ----------------------------
+
+
+def db_acquire_lease(lease_id: str, *, owner: str, ttl: float) -> dict:
+    """
+    Take a lease if nobody holds it or it has expired (by the server's clock).
+    Every time the lease changes hands its fencing ``token`` is increased.
+    :return: the lease, None if another owner holds it
+    """
+    try:
+        return meta_coll.find_one_and_update(
+            {
+                "_id": lease_id,
+                "$or": [
+                    {"owner": None},
+                    {"$expr": {"$lt": ["$expires_at", "$$NOW"]}},
+                ],
+            },
+            [
+                {
+                    "$set": {
+                        "owner": owner,
+                        "token": {"$add": [{"$ifNull": ["$token", 0]}, 1]},
+                        "acquired_at": "$$NOW",
+                        "heartbeat_at": "$$NOW",
+                        "expires_at": {"$add": ["$$NOW", int(ttl * 1000)]},
+                    }
+                }
+            ],
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+    except DuplicateKeyError:
+        # El documento existe y otro proceso tiene el lease
+        return None
+
+
+def db_renew_lease(lease_id: str, *, owner: str, token: int, ttl: float) -> dict:
+    """
+    Extend a lease still held with the given fencing token.
+    :return: the lease, None if it has been lost
+    """
+    return meta_coll.find_one_and_update(
+        {"_id": lease_id, "owner": owner, "token": token},
+        [
+            {
+                "$set": {
+                    "heartbeat_at": "$$NOW",
+                    "expires_at": {"$add": ["$$NOW", int(ttl * 1000)]},
+                }
+            }
+        ],
+        return_document=ReturnDocument.AFTER,
+    )
+
+
+def db_check_lease(lease_id: str, *, owner: str, token: int) -> bool:
+    """Whether the lease is still held, unexpired, with the given fencing token"""
+    return (
+        meta_coll.find_one(
+            {
+                "_id": lease_id,
+                "owner": owner,
+                "token": token,
+                "$expr": {"$gt": ["$expires_at", "$$NOW"]},
+            },
+            {"_id": 1},
+        )
+        is not None
+    )
+
+
+def db_release_lease(lease_id: str, *, owner: str, token: int):
+    """Give up a lease, if still held with the given fencing token"""
+    meta_coll.update_one(
+        {"_id": lease_id, "owner": owner, "token": token}, {"$set": {"owner": None}}
+    )
+
+
+# region Refresh runs ----------------------------
+
+
+def db_find_refresh_run(
+    *, filter: ObjectId | dict = None, projection: dict = {}
+) -> dict:
+    """
+    Get the refresh run matching the id or query a document.
+    :param ``filter`` (optional): a dictionary specifying the query to be performed
+    OR any other type to be used as the value for a query for ``"_id"``
+    :param ``projection`` (optional): fields to include or exclude in the result
+    """
+    return db_find_one(refresh_runs_coll, filter=filter, projection=projection)
+
+
+def db_insert_refresh_run(refresh_run: dict) -> str:
+    """
+    Insert a new refresh run into the database.
+    :param refresh_run: dict
+    :return: Inserted ID (str)
+    """
+    return db_insert_one(refresh_runs_coll, refresh_run)
+
+
+def db_update_refresh_run(*, filter: dict, cambios: dict):
+    """
+    Updates a single refresh run matching the filter.
+    :param filter: refresh run query
+    :param cambios: dict with the changes to apply
+    """
+    return db_update_one(refresh_runs_coll, filter=filter, cambios=cambios)
+
+
+# region Circuit breakers ----------------------------
+
+
+def db_find_circuit(circuit_id: str) -> dict:
+    """
+    Get the state of a circuit breaker, None if it never failed.
+    :param circuit_id: the id of the circuit (``<pid>:<tier>``)
+    """
+    return db_find_one(circuits_coll, filter={"_id": circuit_id})
+
+
+def db_update_circuit(
+    circuit_id: str, cambios: dict, *, expected: dict = {}, upsert: bool = False
+) -> dict:
+    """
+    Update the state of a circuit breaker, only if it still is as expected.
+    :param circuit_id: the id of the circuit (``<pid>:<tier>``)
+    :param cambios: dict with the changes to apply
+    :param expected (optional): fields the circuit must have to be updated
+    :param upsert (optional): whether to create the circuit if it doesn't exist
+    :return: the circuit after the update, None if it wasn't as expected
+    """
+    return circuits_coll.find_one_and_update(
+        {"_id": circuit_id, **expected},
+        cambios,
+        upsert=upsert,
+        return_document=ReturnDocument.AFTER,
+    )
+
+
+# region Scheduler jobs ----------------------------
+
+
+def db_update_job_run(job_id: str, cambios: dict):
+    """
+    Update (or create) the run record of a scheduled job.
+    :param job_id: the id of the job in the scheduler
+    :param cambios: dict with the changes to apply
+    """
+    return job_runs_coll.update_one({"_id": job_id}, cambios, upsert=True)
+
+
 # region Helpers ----------------------------
 
 
@@ -0,0 +1,153 @@
+"""
+Precios de los proveedores, guardados en la base de datos.
+
+Cada fuente de precios tiene una unica copia compartida por todos los
+workers, con la fecha del ultimo scrapeo correcto:
+- Mientras no caduca (``PRICING_TTL``) se sirve tal cual
+- Cuando caduca se sigue sirviendo mientras se refresca en segundo plano
+- Solo refresca quien tiene el lease, el resto sigue sirviendo la copia
+- Si el scrapeo falla se conserva la ultima copia correcta, y no se vuelve a
+  intentar hasta pasados ``PRICING_RETRY_DELAY`` segundos
+"""
+
+import threading
+from datetime import timedelta
+from typing import Callable
+
+from database.mongo_client import (
+    config,
+    db_acquire_pricing_lease,
+    db_find_pricing,
+    db_release_pricing_lease,
+    db_update_pricing,
+)
+from fastapi.logger import logger
+from utils.email_utils import send_error_mail
+from utils.utils import PROCESS_ID, get_current_datetime
+
+# Segundos que se consideran validos unos precios
+PRICING_TTL = float(config.get("PRICING_TTL", 24 * 60 * 60))
+# Segundos que un proceso puede tardar en refrescar los precios antes de
+# que otro pueda intentarlo
+PRICING_LEASE = float(config.get("PRICING_LEASE", 10 * 60))
+# Segundos que se espera tras un scrapeo fallido antes de volver a intentarlo
+PRICING_RETRY_DELAY = float(config.get("PRICING_RETRY_DELAY", 30 * 60))
+
+
+class PricingStore:
+    """Shared, persisted and periodically refreshed prices of a source"""
+
+    def __init__(
+        self,
+        source: str,
+        fetch: Callable[[], list[dict]],
+        *,
+        ttl: float = PRICING_TTL,
+        lease: float = PRICING_LEASE,
+        retry_delay: float = PRICING_RETRY_DELAY,
+    ):
+        """
+        :param source: the id of the source in the database
+        :param fetch: gets the prices, raises if they can't be fetched
+        :param retry_delay: seconds without trying again after a failed fetch
+        """
+        self.source = source
+        self.fetch = fetch
+        self.ttl = ttl
+        self.lease = lease
+        self.retry_delay = retry_delay
+
+    def get(self) -> list[dict]:
+        """
+        The current prices. If they have expired they are refreshed in the
+        background, unless there are none yet, then they are fetched now.
+        Empty only if they have never been fetched successfully.
+        """
+        snapshot = db_find_pricing(self.source) or {}
+        prices: list[dict] = snapshot.get("prices", [])
+        if self.is_fresh(snapshot):
+            return prices
+        if not self.acquire_lease():
+            # Otro proceso lo esta refrescando, se sirve lo que haya
+            return prices
+        if prices:
+            threading.Thread(
+                target=self.refresh, name=f"pricing-{self.source}", daemon=True
+            ).start()
+            return prices
+        return self.refresh() or []
+
+    def revalidate(self, *, ahead: float = 0) -> bool:
+        """
+        Refresh the prices now if they expire in less than ``ahead`` seconds,
+        so that scheduled refreshes keep them fresh for the readers.
+        :return: whether they were refreshed
+        """
+        snapshot = db_find_pricing(self.source) or {}
+        if self.is_fresh(snapshot, ahead=ahead) or not self.acquire_lease():
+            return False
+        return self.refresh() is not None
+
+    @staticmethod
+    def is_fresh(snapshot: dict, *, ahead: float = 0) -> bool:
+        expires_at = snapshot.get("expires_at")
+        return bool(
+            snapshot.get("prices")
+            and expires_at
+            and expires_at > get_current_datetime() + timedelta(seconds=ahead)
+        )
+
+    def acquire_lease(self) -> bool:
+        now = get_current_datetime()
+        return db_acquire_pricing_lease(
+            self.source,
+            owner=PROCESS_ID,
+            now=now,
+            until=now + timedelta(seconds=self.lease),
+        )
+
+    def refresh(self) -> list[dict] | None:
+        """
+        Fetch and store the prices (the lease must be held).
+        None if they couldn't be fetched, the stored ones are kept.
+        """
+        attempted_at = get_current_datetime()
+        try:
+            prices = self.fetch()
+        except Exception as e:
+            logger.error(f"Error fetching the prices of {self.source}: {e}")
+            previous = db_find_pricing(self.source) or {}
+            # Un correo por racha de fallos, no uno por intento
+            if not previous.get("last_error"):
+                send_error_mail(e, f"Error al obtener los precios de {self.source}.")
+            # El lease no se libera: nadie lo vuelve a intentar hasta que caduca
+            db_update_pricing(
+                self.source,
+                {
+                    "$set": {
+                        "attempted_at": attempted_at,
+                        "last_error": str(e),
+                        "lease.until": get_current_datetime()
+                        + timedelta(seconds=self.retry_delay),
+                    }
+                },
+            )
+            return None
+
+        now = get_current_datetime()
+        db_update_pricing(
+            self.source,
+            {
+                "$set": {
+                    "prices": prices,
+                    "attempted_at": attempted_at,
+                    "refreshed_at": now,
+                    "expires_at": now + timedelta(seconds=self.ttl),
+                    "last_error": None,
+                }
+            },
+        )
+        # El lease se libera con los precios ya guardados
+        db_release_pricing_lease(self.source, owner=PROCESS_ID)
+        logger.debug(f"Prices of {self.source} refreshed: {len(prices)}")
+        return prices
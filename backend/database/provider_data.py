@@ -25,6 +25,7 @@ providers_api_data = [
             "module": {
                 "func_to_eval": "get_backends",
                 "module_file": "ionq_api_code",
+                "status_func": "get_status",
             },
         },
         "backends_ids": [],
@@ -49,6 +50,7 @@ providers_api_data = [
             "module": {
                 "func_to_eval": "get_backends",
                 "module_file": "ibm_api_code",
+                "status_func": "get_status",
             },
         },
         "backends_ids": [],
@@ -102,6 +104,7 @@ providers_sdk_data = [
             "module": {
                 "func_to_eval": "get_backends",
                 "module_file": "braket_sdk_code",
+                "status_func": "get_status",
             },
         },
         "backends_ids": [],
@@ -168,3 +171,16 @@ providers_data = (
     + providers_sdk_data
     + providers_data_from_braket
 )
+
+
+def get_providers_data() -> list[dict]:
+    """
+    Current definition of every provider, asking Amazon Braket again
+    for the providers it offers
+    """
+    return (
+        providers_api_data
+        + providers_ws_data
+        + providers_sdk_data
+        + (get_braket_providers() if env_vars_set else [])
+    )
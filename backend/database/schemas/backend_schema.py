@@ -1,31 +1,107 @@
+import hashlib
+import json
+from typing import Callable
+
 from database.models.backends_models import ClassType
-from database.mongo_client import db_find_provider
+from database.mongo_client import db_find_providers
 from database.models.providers_models import ProviderName, ThirdPartyEnum
 from utils.utils import create_bid, from_seconds_to_date, fromisoformat, get_current_time_iso
 
 
-def normalize_backend(backend: dict):
-    """Normalize backend data depending on the provider"""
-    provider = db_find_provider(
-        filter={"_id": backend["provider"]["provider_id"]},
-        projection={"from_third_party": 1, "third_party": 1}
-    )
+# Campos que cambian en cuestion de minutos (el resto apenas cambia)
+VOLATILE_FIELDS = ["status", "queue", "last_updated", "degraded", "has_access"]
+# Campos que no forman parte del contenido del backend
+UNHASHED_FIELDS = ["_id", "last_checked", "price", "hashes"]
+
+
+def hash_fields(backend: dict, fields: list[str]) -> str:
+    """Stable hash of the given fields of a backend"""
+    content = {field: backend[field] for field in fields if field in backend}
+    encoded = json.dumps(content, sort_keys=True, default=str).encode("utf-8")
+    return hashlib.sha1(encoded).hexdigest()
+
+
+def get_backend_hashes(backend: dict) -> dict[str, str]:
+    """Content hashes of the volatile and static fields of a backend"""
+    static_fields = [
+        field
+        for field in backend
+        if field not in VOLATILE_FIELDS and field not in UNHASHED_FIELDS
+    ]
+    return {
+        "static": hash_fields(backend, static_fields),
+        "volatile": hash_fields(backend, VOLATILE_FIELDS),
+    }
+
+
+def get_normalizer_providers(backends: list[dict]) -> dict[str, dict]:
+    """
+    Third party metadata of the providers of the backends,
+    fetched with a single query for the whole batch
+    """
+    ids = list({backend["provider"]["provider_id"] for backend in backends})
+    return {
+        str(provider["_id"]): provider
+        for provider in db_find_providers(
+            filter={"_id": {"$in": ids}},
+            projection={"from_third_party": 1, "third_party": 1},
+        )
+    }
+
+
+def get_normalizer(
+    backend: dict,
+    provider: dict,
+    normalizers: dict[str, Callable],
+    third_party_normalizers: dict[str, Callable],
+) -> Callable[[dict], dict]:
+    """The normalizer of a backend, depending on its provider"""
+    if provider is None:
+        raise ValueError(
+            f"Provider {backend['provider']['provider_id']} of the backend not found"
+        )
     if provider["from_third_party"]:
-        match party_name := provider["third_party"]["third_party_name"]:
-            case ThirdPartyEnum.AWS:
-                norm_back = braket_normalizer(backend)
-            case _:
-                return norm_error(party_name)
+        name = provider["third_party"]["third_party_name"]
+        normalizer = third_party_normalizers.get(name)
     else:
-        match name := backend["provider"]["provider_name"]:
-            case ProviderName.IONQ:
-                norm_back = ionq_normalizer(backend)
-            case ProviderName.IBM:
-                norm_back = ibm_normalizer(backend)
-            case ProviderName.RIGETTI:
-                norm_back = rigetti_normalizer(backend)
-            case _:
-                return norm_error(name)
+        name = backend["provider"]["provider_name"]
+        normalizer = normalizers.get(name)
+    return normalizer or norm_error(name)
+
+
+def normalize_batch(
+    backends: list[dict], normalize: Callable[[dict, dict], dict]
+) -> tuple[list[dict], list[str]]:
+    """
+    Normalize a batch of backends, resolving their providers only once.
+    A backend that can't be normalized doesn't abort the batch, its error
+    is collected instead.
+
+    Returns:
+    - list[dict]: The normalized backends
+    - list[str]: The errors of the backends that couldn't be normalized
+    """
+    providers = get_normalizer_providers(backends)
+    normalized, errors = [], []
+    for i, backend in enumerate(backends):
+        provider = providers.get(str(backend["provider"]["provider_id"]))
+        try:
+            normalized.append(normalize(backend, provider))
+        except Exception as e:
+            name = backend["provider"]["provider_name"]
+            errors.append(f"{name} backend #{i}: {type(e).__name__}: {e}")
+    return normalized, errors
+
+
+def normalize_backend(backend: dict, provider: dict) -> dict:
+    """
+    Normalize backend data depending on the provider
+    :param ``provider``: the provider's ``from_third_party`` and ``third_party``
+    """
+    normalizer = get_normalizer(
+        backend, provider, BACKEND_NORMALIZERS, THIRD_PARTY_BACKEND_NORMALIZERS
+    )
+    norm_back = normalizer(backend)
     norm_back.update({
         "bid": create_bid(norm_back),
         "last_checked": get_current_time_iso()
@@ -33,16 +109,45 @@ def normalize_backend(backend: dict):
     return norm_back
 
 
-def ionq_normalizer(backend: dict) -> dict:
-    """Normalize IonQ backend data"""
-    is_simulator: bool = backend["backend"] == "simulator"
-    norm_back = {
-        "class_type": ClassType.IONQ,
+def normalize_backends(backends: list[dict]) -> tuple[list[dict], list[str]]:
+    """Normalize a batch of backends (see ``normalize_batch``)"""
+    return normalize_batch(backends, normalize_backend)
+
+
+def normalize_status(backend: dict, provider: dict) -> dict:
+    """
+    Normalize only the volatile fields of a backend (status, queue...),
+    identified by its ``bid``
+    :param ``provider``: the provider's ``from_third_party`` and ``third_party``
+    """
+    normalizer = get_normalizer(
+        backend, provider, STATUS_NORMALIZERS, THIRD_PARTY_STATUS_NORMALIZERS
+    )
+    norm_back = normalizer(backend)
+    status = {
+        field: norm_back[field]
+        for field in VOLATILE_FIELDS
+        if norm_back.get(field) is not None
+    }
+    status.update({
+        "bid": create_bid(norm_back),
+        "last_checked": get_current_time_iso()
+    })
+    return status
+
+
+def normalize_statuses(backends: list[dict]) -> tuple[list[dict], list[str]]:
+    """Normalize the volatile fields of a batch of backends (see ``normalize_batch``)"""
+    return normalize_batch(backends, normalize_status)
+
+
+def ionq_status_normalizer(backend: dict) -> dict:
+    """Normalize the volatile fields of IonQ backend data"""
+    return {
         "provider": backend["provider"],
         "backend_name": str(backend["backend"]).removeprefix("qpu.").capitalize(),
         # --------------------------------------
         "status": backend["status"],
-        "qubits": backend["qubits"],
         "queue": {
             "type": "avg_time",
             "value": str(backend["average_queue_time"]),
@@ -51,6 +156,16 @@ def ionq_normalizer(backend: dict) -> dict:
         "degraded": backend["degraded"],
         "has_access": backend["has_access"],
     }
+
+
+def ionq_normalizer(backend: dict) -> dict:
+    """Normalize IonQ backend data"""
+    is_simulator: bool = backend["backend"] == "simulator"
+    norm_back = {
+        "class_type": ClassType.IONQ,
+        **ionq_status_normalizer(backend),
+        "qubits": backend["qubits"],
+    }
     extra_values: list = [
         "status", "qubits", "queue", "last_updated", "degraded", "has_access"
     ]
@@ -66,32 +181,50 @@ def ionq_normalizer(backend: dict) -> dict:
         })
     return norm_back
 
-def ibm_normalizer(backend: dict):
-    """Normalize IBM backend data"""
-    extra: dict = backend["extra"]
-    norm_back = {
-        "class_type": ClassType.IBM,
+
+def ibm_status_normalizer(backend: dict) -> dict:
+    """Normalize the volatile fields of IBM backend data"""
+    return {
         "provider": backend["provider"],
         "backend_name": str(backend["backend"]).removeprefix("ibm_").capitalize(),
         # --------------------------------------
         "status": backend["status"],
-        "qubits": backend["qubits"],
         "queue": {
             "type": "jobs_remaining",
             "value": str(backend["queue"]),
-        },
-        "last_updated": fromisoformat(backend["last_updated"]),
+        } if backend["queue"] is not None else None,
+    }
+
+
+def ibm_normalizer(backend: dict):
+    """
+    Normalize IBM backend data.
+    Fields that could not be fetched (``None``) are left out.
+    """
+    extra: dict = backend["extra"]
+    norm_back = {
+        "class_type": ClassType.IBM,
+        **ibm_status_normalizer(backend),
+        "qubits": backend["qubits"],
+        "last_updated": (
+            fromisoformat(backend["last_updated"]) if backend["last_updated"] else None
+        ),
         "basis_gates": extra["basis_gates"],
         "clops_h": extra["clops_h"],
         "credits_required": extra["credits_required"],
         "max_experiments": extra["max_experiments"],
         "max_shots": extra["max_shots"],
-        "extra": [
+    }
+    norm_back = {key: value for key, value in norm_back.items() if value is not None}
+    norm_back["extra"] = [
+        field
+        for field in [
             "status", "qubits", "queue",
             "last_updated", "basis_gates", "clops_h",
             "credits_required", "max_experiments", "max_shots"
         ]
-    }
+        if field in norm_back
+    ]
     return norm_back
 
 
@@ -113,19 +246,27 @@ def rigetti_normalizer(backend: dict):
         ]
     }
 
-def braket_normalizer(backend: dict):
-    """Normalize Braket backend data"""
+
+def braket_status_normalizer(backend: dict) -> dict:
+    """Normalize the volatile fields of Braket backend data"""
     return {
-        "class_type": ClassType.BRAKET,
         "provider": backend["provider"],
         "backend_name": backend["device_name"],
         # --------------------------------------
         "status": backend["status"],
-        "qubits": backend["qubit_count"],
         "queue": {
             "type": "jobs_remaining",
             "value": backend["queue_depth"],
         },
+    }
+
+
+def braket_normalizer(backend: dict):
+    """Normalize Braket backend data"""
+    return {
+        "class_type": ClassType.BRAKET,
+        **braket_status_normalizer(backend),
+        "qubits": backend["qubit_count"],
         "gates_supported": backend["gates_supported"],
         "shots_range": backend["shots_range"],
         "device_cost": backend["device_cost"],
@@ -135,6 +276,20 @@ def braket_normalizer(backend: dict):
     }
 
 
+# Normalizador de cada proveedor (o plataforma de terceros)
+BACKEND_NORMALIZERS = {
+    ProviderName.IONQ: ionq_normalizer,
+    ProviderName.IBM: ibm_normalizer,
+    ProviderName.RIGETTI: rigetti_normalizer,
+}
+THIRD_PARTY_BACKEND_NORMALIZERS = {ThirdPartyEnum.AWS: braket_normalizer}
+STATUS_NORMALIZERS = {
+    ProviderName.IONQ: ionq_status_normalizer,
+    ProviderName.IBM: ibm_status_normalizer,
+}
+THIRD_PARTY_STATUS_NORMALIZERS = {ThirdPartyEnum.AWS: braket_status_normalizer}
+
+
 def norm_error(name: str):
     """Raise an error if the provider is not supported"""
     raise ValueError(f"Backend {name} not supported")
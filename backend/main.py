@@ -1,15 +1,45 @@
 import logging
 import sys
+import threading
 from contextlib import asynccontextmanager
 
-from apscheduler.events import EVENT_JOB_ERROR, EVENT_JOB_EXECUTED
+from apscheduler.events import (
+    EVENT_JOB_ERROR,
+    EVENT_JOB_EXECUTED,
+    EVENT_JOB_MISSED,
+    JobExecutionEvent,
+)
+from apscheduler.jobstores.mongodb import MongoDBJobStore
 from apscheduler.schedulers.background import BackgroundScheduler
-from database.mongo_client import is_empty
+from apscheduler.triggers.cron import CronTrigger
+from apscheduler.triggers.date import DateTrigger
+from apscheduler.triggers.interval import IntervalTrigger
+from database.async_mongo_client import async_db_client
+from database.indexes import ensure_indexes
+from database.mongo_client import db_client, db_prod, db_update_job_run, is_empty
 from fastapi import FastAPI
 from fastapi.logger import logger
 from fastapi.middleware.cors import CORSMiddleware
-from routers import provider_router, user_router, account_router, backend_router, job_router, helper_router
-from utils.scheduler_functions import init_backends, init_providers, job_manager, schedule_providers
+from routers import provider_router, user_router, account_router, backend_router, job_router, helper_router, metrics_router
+from utils.http_client import http_client
+from utils.leader_lease import leader_lease
+from utils.metrics import (
+    SCHEDULER_JOBS,
+    SCHEDULER_JOBS_RUNNING,
+    metrics_middleware,
+    track_scheduler,
+)
+from utils.webdriver_pool import webdriver_pool
+from utils.scheduler_functions import (
+    JOB_MISFIRE_GRACE_TIME,
+    LIVE_STATUS_INTERVAL,
+    init_backends,
+    init_live_status,
+    init_providers,
+    job_manager,
+    refresh_pricing,
+    schedule_providers,
+)
 
 
 def init_logger():
@@ -22,72 +52,160 @@ def init_logger():
     logger.addHandler(stream_handler)
 
 
+def schedule_job(scheduler: BackgroundScheduler, job_id: str, func, trigger):
+    """
+    Add a job to the scheduler, unless it is already persisted with the same
+    function and trigger: then its schedule (next run) is kept as it was.
+    """
+    job = scheduler.get_job(job_id)
+    if job is not None and job.func is func and str(job.trigger) == str(trigger):
+        logger.debug(f"Resuming job '{job_id}', next run at {job.next_run_time}")
+        return job
+    logger.debug(f"Scheduling job '{job_id}' ({trigger})")
+    return scheduler.add_job(func, trigger=trigger, id=job_id, replace_existing=True)
+
+
 def init_database(scheduler: BackgroundScheduler):
     # Si la coleccion de proveedores esta vacia
     if is_empty("providers"):
         logger.debug("Initializing providers")
         # No lo ejecuto en un hilo diferente para bloquear la ejecucion
         init_providers()
-    # [x] REWORK: Si la coleccion de proveedores NO esta vacia, 
-    # lanzar schedule semanal para actualizar los proveedores 
-    # ('schedule_providers' se encarga de todo)
-    else:
-        logger.debug("Setting 'init_providers' function to run every week on Sunday at 0:00 AM")
-        scheduler.add_job(
-            func=schedule_providers,
-            args=[scheduler],
-            trigger="cron",
-            minute="0",
-            hour="0",
-            day_of_week="sun",
-            id="job_init_providers",
-            replace_existing=True,
-        )
-        
-
-    # Si la coleccion de backends esta vacia
-    if is_empty("backends"):
+    # 'schedule_providers' actualiza los proveedores cada domingo a las 0:00 AM
+    schedule_job(
+        scheduler,
+        "job_init_providers",
+        schedule_providers,
+        CronTrigger(minute="0", hour="0", day_of_week="sun"),
+    )
+
+    # Si la coleccion de backends esta vacia, se obtienen ya (una sola vez,
+    # el trabajo queda guardado hasta que se ejecuta)
+    if is_empty("backends") and scheduler.get_job("job_first_backends") is None:
         logger.debug("Setting 'init_backends' function to run immediately")
-        scheduler.add_job(
-            func=init_backends,
-            args=[scheduler],
-            id="job_init_backends",
-            replace_existing=True,
-        )
-    # Si la coleccion de backends NO esta vacia
+        scheduler.add_job(init_backends, trigger=DateTrigger(), id="job_first_backends")
+    # Y se refrescan todos los dias a las 2:00 AM
+    schedule_job(
+        scheduler,
+        "job_init_backends",
+        init_backends,
+        CronTrigger(minute="0", hour="2"),
+    )
+
+    # Los precios se refrescan antes, para que esten al dia a las 2:00 AM
+    schedule_job(
+        scheduler,
+        "job_pricing",
+        refresh_pricing,
+        CronTrigger(minute="0", hour="1"),
+    )
+
+    # El estado y la cola de los backends se refrescan con mas frecuencia
+    schedule_job(
+        scheduler,
+        "job_live_status",
+        init_live_status,
+        IntervalTrigger(minutes=LIVE_STATUS_INTERVAL),
+    )
+
+
+def record_job_run(scheduler: BackgroundScheduler, event: JobExecutionEvent):
+    """Save when a job last ran, how it went and when it will run again"""
+    job = scheduler.get_job(event.job_id)
+    if event.code == EVENT_JOB_MISSED:
+        status = "missed"
     else:
-        logger.debug("Setting 'init_backends' function to run every day at 2:00 AM")
-        scheduler.add_job(
-            func=init_backends,
-            args=[scheduler],
-            trigger="cron",
-            minute="0",
-            hour="2",
-            id="job_init_backends",
-            replace_existing=True,
-        )
+        status = "failed" if event.exception else "success"
+    db_update_job_run(
+        event.job_id,
+        {
+            "$set": {
+                "last_run": event.scheduled_run_time,
+                "last_status": status,
+                "last_error": str(event.exception) if event.exception else None,
+                "next_run": job.next_run_time if job else None,
+            }
+        },
+    )
 
 
 def init_scheduler():
-    scheduler = BackgroundScheduler()
+    # Los trabajos se guardan en la base de datos, asi al reiniciar la app
+    # (o cambiar de lider) se retoma la planificacion en vez de empezarla
+    scheduler = BackgroundScheduler(
+        jobstores={
+            "default": MongoDBJobStore(
+                database=db_prod.name, collection="scheduler_jobs", client=db_client
+            )
+        },
+        job_defaults={
+            # Las ejecuciones perdidas se juntan en una sola
+            "coalesce": True,
+            "misfire_grace_time": JOB_MISFIRE_GRACE_TIME,
+            "max_instances": 1,
+        },
+    )
     scheduler.add_listener(job_manager, EVENT_JOB_EXECUTED | EVENT_JOB_ERROR)
+    track_scheduler(scheduler)
+    scheduler.add_listener(
+        lambda event: record_job_run(scheduler, event),
+        EVENT_JOB_EXECUTED | EVENT_JOB_ERROR | EVENT_JOB_MISSED,
+    )
     return scheduler
 
 
+# Solo el worker lider ejecuta el scheduler
+scheduler: BackgroundScheduler = None
+scheduler_lock = threading.Lock()
+
+
+def start_scheduler():
+    """Start the scheduled work, once this process becomes the leader"""
+    global scheduler
+    with scheduler_lock:
+        if scheduler is not None or not leader_lease.is_leader:
+            return
+        scheduler = init_scheduler()
+        # En pausa, para ver los trabajos guardados antes de ejecutar ninguno
+        scheduler.start(paused=True)
+        init_database(scheduler)
+        logger.debug(f"Jobs queued: {scheduler.get_jobs()}")
+        logger.debug("Starting scheduler")
+        scheduler.resume()
+
+
+def stop_scheduler():
+    """Stop the scheduled work, once this process is no longer the leader"""
+    global scheduler
+    with scheduler_lock:
+        if scheduler is None or leader_lease.is_leader:
+            return
+        logger.debug("Stopping scheduler")
+        scheduler.shutdown(wait=False)
+        scheduler = None
+        # Con wait=False no llegan los eventos de los trabajos en curso
+        SCHEDULER_JOBS.set(0)
+        SCHEDULER_JOBS_RUNNING.set(0)
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Inicializar el logger
     init_logger()
     # ---------------------
-    # Inicializar el scheduler
-    scheduler = init_scheduler()
-    init_database(scheduler)
+    # Comprobar y crear los indices de la base de datos
+    logger.debug("Ensuring database indexes")
+    ensure_indexes()
     # ---------------------
-    logger.debug("Starting scheduler")
-    logger.debug(f"Jobs queued: {scheduler.get_jobs()}")
-    scheduler.start()
+    # El scheduler se inicia solo en el worker que tenga el lease de lider
+    leader_lease.on_acquired = start_scheduler
+    leader_lease.on_lost = stop_scheduler
+    leader_lease.start()
     yield
-    scheduler.shutdown()
+    leader_lease.stop()
+    async_db_client.close()
+    http_client.close()
+    webdriver_pool.close()
 
 
 app = FastAPI(lifespan=lifespan)
@@ -101,6 +219,8 @@ origins = [
     "https://quantum-proxy.vercel.app",
 ]
 
+app.middleware("http")(metrics_middleware)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=origins,
@@ -140,6 +260,11 @@ app.include_router(
     # prefix="/api/v1",
 )
 
+app.include_router(
+    metrics_router.router,
+    # prefix="/api/v1",
+)
+
 
 @app.get("/")
 async def root():
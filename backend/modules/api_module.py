@@ -1,13 +1,11 @@
-import importlib.util
 import os
-from pathlib import Path
 
 from bson import ObjectId
 from database.models.providers_models import APIRequest, BaseProviderModel
 from database.models.user_models import UserModel
 from database.mongo_client import db_find_user
 from dotenv import dotenv_values
-from utils.utils import check_code
+from modules.module_loader import module_loader
 
 env = {
     **dotenv_values(),
@@ -31,28 +29,22 @@ def get_auth_if_needed(request: APIRequest, *, provider_key: str):
         return auth
 
 
-def fetch_from_api(provider: BaseProviderModel) -> list[dict]:
+def fetch_from_api(provider: BaseProviderModel, func: str = None) -> list[dict]:
     """
     Fetches the backends from the provider's API
 
+    Args:
+    - func (str, optional): Function of the module to run,
+    defaults to the module's ``func_to_eval``
+
     Returns:
     - list[dict]: A list of backends
     """
     print("Fetching from API...")
     module = provider.backend_request.module
-    func = module.func_to_eval
-    file_name = module.module_file
-    file_path = (
-        Path(__file__).parent.joinpath("source_files").joinpath(f"{file_name}.py")
-    )
-
-    if not check_code(file_path):
-        return []
-
-    # Importamos el módulo dinámicamente desde el archivo externo
-    especificacion = importlib.util.spec_from_file_location(file_name, file_path)
-    modulo = importlib.util.module_from_spec(especificacion)
-    especificacion.loader.exec_module(modulo)
+    func = func or module.func_to_eval
+    # El módulo solo se valida y se ejecuta de nuevo si el archivo ha cambiado
+    modulo = module_loader.require(module.module_file)
 
     # Ejecutamos la función designada y obtenemos los datos
     raw_output: list[dict] = getattr(modulo, func)(provider.backend_request)
@@ -1,21 +1,111 @@
+import threading
+from contextlib import contextmanager
+
 from database.models.providers_models import BaseProviderModel
-from database.schemas.backend_schema import normalize_backend
+from database.schemas.backend_schema import normalize_backends, normalize_statuses
+from fastapi.logger import logger
 from modules.api_module import fetch_from_api
 from modules.scraper_module import fetch_from_ws
 from modules.sdk_module import fetch_from_sdk
+from utils.circuit_breaker import CircuitBreaker
+from utils.refresh_telemetry import (
+    STAGE_FETCH,
+    STAGE_NORMALIZE,
+    add_errors,
+    count,
+    stage,
+)
+
+
+# Cada tipo de llamada tiene su circuito: el estado, cada pocos minutos, no
+# puede cerrar el del refresco completo cuando solo falla este
+TIER_FULL = "full"
+TIER_STATUS = "status"
+
+
+def provider_circuit(provider: BaseProviderModel, tier: str) -> CircuitBreaker:
+    """The circuit breaker of a type of calls (``TIER_*``) to a provider"""
+    return CircuitBreaker(f"{provider.pid}:{tier}")
+
 
+@contextmanager
+def circuit_call(
+    provider: BaseProviderModel, tier: str, cancel_event: threading.Event = None
+):
+    """
+    Call a provider through the circuit breaker of the tier of the call.
+    If the call was abandoned meanwhile (``cancel_event`` set when the refresh
+    timed out), its outcome is not recorded: the timeout already was.
+    :raises CircuitOpenError: if the provider is failing and is not called
+    """
+    circuit = provider_circuit(provider, tier)
+    circuit.before_call()
+    try:
+        yield
+    except Exception as e:
+        if not (cancel_event and cancel_event.is_set()):
+            circuit.record_failure(e)
+        raise
+    if not (cancel_event and cancel_event.is_set()):
+        circuit.record_success()
 
-def fetch_data(provider: BaseProviderModel):
+
+def fetch_data(
+    provider: BaseProviderModel, cancel_event: threading.Event = None
+) -> tuple[list[dict], list[str]]:
+    """
+    Fetches and normalizes the backends of the provider.
+    Returns the normalized backends and the errors of the ones that
+    couldn't be normalized (both empty if the provider has no request).
+    Raises ``CircuitOpenError`` if the provider is failing and is not called.
+    """
     request = provider.backend_request
     if not request:
+        return [], []
+    with circuit_call(provider, TIER_FULL, cancel_event), stage(STAGE_FETCH):
+        match request.fetch_method:
+            case "API":
+                data = fetch_from_api(provider)
+            case "WEB-SCRAPING":
+                data = fetch_from_ws(provider)
+            case "SDK":
+                data = fetch_from_sdk(provider)
+            case _:
+                return [], []
+    count("fetched", len(data))
+    with stage(STAGE_NORMALIZE):
+        backends, errors = normalize_backends(data)
+    count("normalized", len(backends))
+    log_errors(provider, errors)
+    return backends, errors
+
+
+def fetch_status(provider: BaseProviderModel, cancel_event: threading.Event = None):
+    """
+    Fetches only the volatile fields (status, queue...) of the provider's backends,
+    using the module's ``status_func``. None if the provider doesn't support it.
+    Raises ``CircuitOpenError`` if the provider is failing and is not called.
+    """
+    request = provider.backend_request
+    if not request or not (func := request.module.status_func):
         return None
-    match request.fetch_method:
-        case "API":
-            data = fetch_from_api(provider)
-        case "WEB-SCRAPING":
-            data = fetch_from_ws(provider)
-        case "SDK":
-            data = fetch_from_sdk(provider)
-        case _:
-            return None
-    return list(map(normalize_backend, data))
+    with circuit_call(provider, TIER_STATUS, cancel_event), stage(STAGE_FETCH):
+        match request.fetch_method:
+            case "API":
+                data = fetch_from_api(provider, func)
+            case "SDK":
+                data = fetch_from_sdk(provider, func)
+            case _:
+                return None
+    count("fetched", len(data))
+    with stage(STAGE_NORMALIZE):
+        statuses, errors = normalize_statuses(data)
+    count("normalized", len(statuses))
+    log_errors(provider, errors)
+    return statuses
+
+
+def log_errors(provider: BaseProviderModel, errors: list[str]):
+    add_errors(errors)
+    for error in errors:
+        logger.error(f"Could not normalize a backend of {provider.name}: {error}")
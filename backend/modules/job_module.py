@@ -1,4 +1,4 @@
-import requests
+from utils.http_client import http_client
 
 
 def get_jobs(platform: str, keys: dict):
@@ -49,7 +49,7 @@ def delete_job(uuid: str, platform: str, keys: dict):
 
 def get_jobs_from_ionq(keys: dict):
     base_url = "https://api.ionq.co/v0.3"
-    jobs = requests.get(
+    jobs = http_client.get(
         f"{base_url}/jobs",
         headers={"Authorization": f"apiKey {keys["TOKEN"]}"},
     ).json()
@@ -58,7 +58,7 @@ def get_jobs_from_ionq(keys: dict):
 
 def get_job_from_ionq(uuid: str, keys: dict):
     base_url = "https://api.ionq.co/v0.3"
-    job = requests.get(
+    job = http_client.get(
         f"{base_url}/jobs/{uuid}",
         headers={"Authorization": f"apiKey {keys["TOKEN"]}"},
     ).json()
@@ -67,7 +67,7 @@ def get_job_from_ionq(uuid: str, keys: dict):
 
 def get_job_output_from_ionq(uuid: str, keys: dict):
     base_url = "https://api.ionq.co/v0.3"
-    job_output = requests.get(
+    job_output = http_client.get(
         f"{base_url}/jobs/{uuid}/results",
         headers={"Authorization": f"apiKey {keys["TOKEN"]}"},
     ).json()
@@ -88,7 +88,7 @@ def create_job_on_ionq(job: dict, api_keys: dict):
             "circuit": job.get("circuit"),
         }
     }
-    job_status = requests.post(
+    job_status = http_client.post(
         f"{base_url}/jobs",
         json=ionq_job,
         headers={"Authorization": f"apiKey {keys["TOKEN"]}"},
@@ -98,7 +98,7 @@ def create_job_on_ionq(job: dict, api_keys: dict):
 
 def delete_job_from_ionq(uuid: str, keys: dict):
     base_url = "https://api.ionq.co/v0.3"
-    job = requests.delete(
+    job = http_client.delete(
         f"{base_url}/jobs/{uuid}",
         headers={"Authorization": f"apiKey {keys["TOKEN"]}"},
     )
@@ -0,0 +1,84 @@
+"""
+Cargador de los modulos de ``source_files`` con cache.
+
+Cada modulo se valida (``check_source``) y se ejecuta una sola vez, y se
+guarda junto al hash de su contenido. Mientras el archivo no cambie, las
+siguientes cargas devuelven el mismo modulo; si cambia, se vuelve a validar
+y a ejecutar.
+"""
+
+import hashlib
+import importlib.util
+import threading
+from pathlib import Path
+from types import ModuleType
+
+from utils.refresh_telemetry import STAGE_MODULE_LOAD, stage
+from utils.utils import check_source
+
+SOURCE_FILES_PATH = Path(__file__).parent.joinpath("source_files")
+
+
+class ModuleLoadError(Exception):
+    """The module doesn't exist or its code is not valid"""
+
+
+class ModuleLoader:
+    """Loads fetcher modules, caching them by path and content hash"""
+
+    def __init__(self):
+        # path -> (hash del contenido, modulo o None si no ha pasado la validacion)
+        self.modules: dict[str, tuple[str, ModuleType | None]] = {}
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def load(self, file_name: str) -> ModuleType | None:
+        """
+        Get the module of ``source_files/<file_name>.py``.
+        None if the file doesn't exist or its code is not valid.
+        """
+        with stage(STAGE_MODULE_LOAD):
+            file_path = SOURCE_FILES_PATH.joinpath(f"{file_name}.py")
+            if not file_path.exists():
+                print(f"File {file_path.name} not found.")
+                return None
+            code = file_path.read_bytes()
+            digest = hashlib.sha256(code).hexdigest()
+
+            with self.lock:
+                cached = self.modules.get(str(file_path))
+                if cached is not None and cached[0] == digest:
+                    self.hits += 1
+                    return cached[1]
+                self.misses += 1
+                module = self.exec_module(file_name, file_path, code)
+                self.modules[str(file_path)] = (digest, module)
+            return module
+
+    def require(self, file_name: str) -> ModuleType:
+        """
+        Like ``load``, for the fetchers: a module that can't be loaded is an
+        error of the call to the provider, not a provider without backends.
+        :raises ModuleLoadError: if the file doesn't exist or its code is not valid
+        """
+        if not (module := self.load(file_name)):
+            raise ModuleLoadError(f"Module {file_name} could not be loaded")
+        return module
+
+    @staticmethod
+    def exec_module(file_name: str, file_path: Path, code: bytes) -> ModuleType | None:
+        if not check_source(code.decode("utf-8")):
+            return None
+        # Se ejecuta el contenido ya leido (y validado), no se vuelve a leer el archivo
+        especificacion = importlib.util.spec_from_file_location(file_name, file_path)
+        modulo = importlib.util.module_from_spec(especificacion)
+        exec(compile(code, str(file_path), "exec"), modulo.__dict__)
+        return modulo
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses, "modules": len(self.modules)}
+
+
+# Cargador compartido por todo el proceso
+module_loader = ModuleLoader()
@@ -1,35 +1,117 @@
-import importlib.util
+import time
 from contextlib import contextmanager
-from pathlib import Path
+from types import ModuleType
+from typing import Callable
 
+import lxml.html
 from bson import ObjectId
 from database.models.providers_models import BaseProviderModel
-from selenium import webdriver
-from selenium.common.exceptions import NoSuchElementException
-from utils.email_utils import send_error_mail
-from utils.utils import check_code
+from lxml.html import HtmlElement
+from modules.module_loader import module_loader
+from selenium.common.exceptions import WebDriverException
+from utils.http_client import http_client
+from utils.metrics import record_upstream
+from utils.webdriver_pool import PooledDriver, webdriver_pool
 
 
 @contextmanager
 def innit_driver(url: str):
-    driver: webdriver.Chrome = None
-    """Context manager para inicializar y cerrar el webdriver de Chrome."""
+    """
+    Context manager que presta un webdriver de Chrome del pool compartido,
+    con la url ya cargada, y lo devuelve al pool al terminar.
+    Si no se puede obtener o cargar la url, devuelve None.
+    """
+    pooled: PooledDriver = None
     try:
-        options = webdriver.ChromeOptions()
-        options.add_argument("--headless=new")  # Para ejecutar en modo sin ventana
-        print("Iniciando webdriver...")
-        driver = webdriver.Chrome(options=options)
-
-        driver.get(url)
-        driver.implicitly_wait(10)
-
-        yield driver
-    except:
+        pooled = webdriver_pool.acquire()
+        start = time.perf_counter()
+        try:
+            pooled.driver.get(url)
+        except Exception as e:
+            record_upstream(
+                url, "webdriver", time.perf_counter() - start, type(e).__name__
+            )
+            raise
+        record_upstream(url, "webdriver", time.perf_counter() - start)
+    except Exception as e:
+        print(f"Error al iniciar el webdriver: {e}")
+        if pooled:
+            webdriver_pool.release(pooled)
         yield None
+        return
+    try:
+        yield pooled.driver
     finally:
-        print("Cerrando webdriver...")
-        if driver:
-            driver.quit()
+        webdriver_pool.release(pooled)
+
+
+# region Static scraping
+
+# Sufijo de las funciones que extraen los datos sin navegador (``get_backends_static``)
+STATIC_SUFFIX = "_static"
+
+
+class NeedsBrowser(Exception):
+    """The data can't be read without running the page's JavaScript"""
+
+
+def element_text(element: HtmlElement) -> str:
+    """Visible text of an element, with the whitespace collapsed (like selenium)"""
+    return " ".join(element.text_content().split())
+
+
+def get_section_static(section: HtmlElement) -> dict:
+    """Get the title and the table of a properties section of a page"""
+    titulo_h3 = element_text(section.xpath(".//h3")[0])
+    section_dict = {titulo_h3: {}}
+    for row in section.xpath(".//tr"):
+        key, value = map(element_text, row.xpath(".//td"))
+        section_dict[titulo_h3].update({key: value})
+    return section_dict
+
+
+def fetch_static(url: str) -> HtmlElement | list | dict:
+    """
+    Get a page with a plain HTTP request.
+    Returns the parsed JSON if the url is a JSON endpoint, the parsed HTML otherwise.
+    """
+    response = http_client.get(url)
+    response.raise_for_status()
+    if "json" in response.headers.get("Content-Type", ""):
+        return response.json()
+    return lxml.html.fromstring(response.content)
+
+
+def scrape_static(
+    extractor: Callable[[HtmlElement | list | dict], list[dict]], url: str
+) -> list[dict] | None:
+    """
+    Run a static extractor over the page fetched with plain HTTP.
+    None if it fails or the page needs a browser, so the caller can fall back
+    to selenium.
+    """
+    try:
+        output = extractor(fetch_static(url))
+    except NeedsBrowser as e:
+        print(f"{url} necesita un navegador: {e}")
+        return None
+    except Exception as e:
+        print(f"Error al obtener {url} sin navegador: {type(e).__name__}: {e}")
+        return None
+    # Una pagina sin datos suele significar que se cargan con JavaScript
+    return output or None
+
+
+def get_static_extractor(modulo: ModuleType, func: str) -> Callable | None:
+    """
+    The static extractor declared by a scraper module for ``func``, if any.
+    A module can also declare ``STATIC_URL`` to read a JSON endpoint or
+    another page instead of the provider's ``base_url``.
+    """
+    return getattr(modulo, f"{func}{STATIC_SUFFIX}", None)
+
+
+# endregion
 
 
 def fetch_from_ws(provider: BaseProviderModel) -> list[dict]:
@@ -42,42 +124,41 @@ def fetch_from_ws(provider: BaseProviderModel) -> list[dict]:
     print("Fetching from web scraping...")
     module = provider.backend_request.module
     func = module.func_to_eval
-    file_name = module.module_file
-    file_path = (
-        Path(__file__).parent.joinpath("source_files").joinpath(f"{file_name}.py")
+    # El módulo solo se valida y se ejecuta de nuevo si el archivo ha cambiado
+    modulo = module_loader.require(module.module_file)
+
+    url = provider.backend_request.base_url
+    raw_output: list[dict] = None
+    # Primero se intenta sin navegador, si el módulo lo permite
+    if extractor := get_static_extractor(modulo, func):
+        raw_output = scrape_static(extractor, getattr(modulo, "STATIC_URL", url))
+
+    if raw_output is None:
+        raw_output = scrape_with_driver(modulo, func, url)
+
+    provider_data = {
+        "provider_id": ObjectId(provider.id),
+        "provider_name": provider.name,
+    }
+    raw_output = list(
+        map(
+            lambda back: back.update({"provider": provider_data}) or back,
+            raw_output,
+        )
     )
+    return raw_output
 
-    if not check_code(file_path):
-        return []
 
+def scrape_with_driver(modulo: ModuleType, func: str, url: str) -> list[dict]:
+    """
+    Run ``func`` of the module with a webdriver.
+    Raises if there is no webdriver or the scraping fails (the gateway's
+    circuit breaker counts the failure and sends the error mail).
+    """
     # Ejecutar el código en un contexto que proporciona un webdriver
-    with innit_driver(provider.backend_request.base_url) as driver:
+    with innit_driver(url) as driver:
         # FIX: Por algún motivo selenium no funciona en la versión dockerizada
         if not driver:
-            return []
-        # Importamos el módulo dinámicamente desde el archivo externo
-        especificacion = importlib.util.spec_from_file_location(file_name, file_path)
-        modulo = importlib.util.module_from_spec(especificacion)
-        especificacion.loader.exec_module(modulo)
-
-        raw_output: list[dict] = []
-        try:
-            # Ejecutamos la función designada y obtenemos los datos
-            raw_output = getattr(modulo, func)(driver)
-        except NoSuchElementException as error:
-            print(f"Error al obtener los datos: {error.msg}")
-            send_error_mail(error, "Error al obtener los datos via webscraping.")
-        except Exception as error:
-            print(f"Error inesperado: {error}")
-            send_error_mail(error, "Error inesperado al obtener los datos via webscraping.")
-        provider_data = {
-            "provider_id": ObjectId(provider.id),
-            "provider_name": provider.name,
-        }
-        raw_output = list(
-            map(
-                lambda back: back.update({"provider": provider_data}) or back,
-                raw_output,
-            )
-        )
-    return raw_output
+            raise WebDriverException(f"No webdriver available to scrape {url}")
+        # Ejecutamos la función designada y obtenemos los datos
+        return getattr(modulo, func)(driver)
@@ -11,25 +11,33 @@ from modules.sdk_module import get_env_vars_if_needed
 from utils.utils import norm_str
 
 
-def process_device(device: AwsDevice) -> dict[str, Any]:
+def get_device_provider(device: AwsDevice) -> dict[str, Any]:
     provider = db_find_provider(
         filter={
             "pid": f"{norm_str(ThirdPartyEnum.AWS)}.{norm_str(device.provider_name)}"
         }
     )
+    return {
+        "provider_id": ObjectId(provider["_id"]),
+        "provider_name": provider["name"],
+        "provider_from": ThirdPartyEnum.AWS
+    }
 
-    # --------------------------------------
-    supports_gates = device.properties.action.get(DeviceActionType.OPENQASM, None)
+
+def process_device_status(device: AwsDevice) -> dict[str, Any]:
     return {
-        "provider": {
-            "provider_id": ObjectId(provider["_id"]),
-            "provider_name": provider["name"],
-            "provider_from": ThirdPartyEnum.AWS
-        },
+        "provider": get_device_provider(device),
         "device_name": device.name,
         "status": device.status.lower(),
-        "qubit_count": device.properties.paradigm.qubitCount,
         "queue_depth": device.queue_depth().quantum_tasks.get(QueueType.NORMAL, -1),
+    }
+
+
+def process_device(device: AwsDevice) -> dict[str, Any]:
+    supports_gates = device.properties.action.get(DeviceActionType.OPENQASM, None)
+    return {
+        **process_device_status(device),
+        "qubit_count": device.properties.paradigm.qubitCount,
         "gates_supported": supports_gates.supportedOperations if supports_gates else [],
         "shots_range": {
             "min": device.properties.service.shotsRange[0],
@@ -43,16 +51,21 @@ def process_device(device: AwsDevice) -> dict[str, Any]:
     }
 
 
-def get_backends(request: SDKRequest = None) -> list[dict[str, Any]]:
-    try:
-        key_value_list = get_env_vars_if_needed(request, provider_key="amazon_braket")
-    except ValueError as err:
-        print("Exception:", err)
-        return []
-
+def set_credentials(request: SDKRequest = None):
+    # Sin credenciales el error llega al circuit breaker
+    key_value_list = get_env_vars_if_needed(request, provider_key="amazon_braket")
     for key, value in key_value_list:
         os.environ[key] = value
 
+
+def get_status(request: SDKRequest = None) -> list[dict[str, Any]]:
+    set_credentials(request)
+    return [process_device_status(device) for device in AwsDevice.get_devices()]
+
+
+def get_backends(request: SDKRequest = None) -> list[dict[str, Any]]:
+    set_credentials(request)
+
     output = []
     for device in AwsDevice.get_devices():
         output.append(process_device(device))
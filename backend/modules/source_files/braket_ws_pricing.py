@@ -3,63 +3,89 @@
 
 Codigo para obtener los precios de los sistemas cuanticos y simuladores de la pagina de AWS Braket.
 - ``get_system_pricing``: Obtiene los precios de los sistemas cuanticos
+(sin navegador si es posible, ``get_system_pricing_static``)
 - ``get_simulator_pricing``: Obtiene los precios de los simuladores cuanticos
+- ``get_pricing``: Obtiene los precios guardados, refrescandolos si han caducado
 """
 
-from contextlib import contextmanager
-from selenium import webdriver
+from lxml.html import HtmlElement
+from selenium.common.exceptions import WebDriverException
 from selenium.webdriver.common.by import By
-
-from utils.email_utils import send_error_mail
-
-
-@contextmanager
-def innit_driver(url: str):
-    driver: webdriver.Chrome = None
-    """Context manager para inicializar y cerrar el webdriver de Chrome."""
-    try:
-        options = webdriver.ChromeOptions()
-        options.add_argument("--headless=new")  # Para ejecutar en modo sin ventana
-        print("Iniciando webdriver...")
-        driver = webdriver.Chrome(options=options)
-
-        driver.get(url)
-        driver.implicitly_wait(10)
-
-        yield driver
-    except:
-        yield None
-    finally:
-        print("Cerrando webdriver...")
-        if driver:
-            driver.quit()
+from selenium.webdriver.support import expected_conditions as EC
+from selenium.webdriver.support.ui import WebDriverWait
+
+from database.pricing_store import PricingStore
+from modules.scraper_module import (
+    NeedsBrowser,
+    element_text,
+    innit_driver,
+    scrape_static,
+)
+
+
+PRICING_URL = "https://aws.amazon.com/es/braket/pricing/"
+PRICING_TABLE_XPATH = (
+    "/html/body/div[2]/main/div[3]/div/div/div/ul[2]/li[2]/div/div[2]/table"
+)
+
+
+def parse_price(text: str) -> float:
+    return float(text.split()[0].replace(",", "."))
+
+
+def build_system_price(fila: list[str]) -> dict:
+    """Get the pricing of a QPU from the cells of its row in the table"""
+    hardware_provider, qpu_family = fila[0], fila[1]
+    per_task_price = parse_price(fila[2])
+    per_shot_price = parse_price(fila[3])
+    return {
+        "hardware_provider": hardware_provider,
+        "qpu_family": qpu_family,
+        "price": {
+            "full_price": f"${str(per_task_price)}/task + ${str(per_shot_price)}/shot",
+            "per_task_price": per_task_price,
+            "per_shot_price": per_shot_price,
+        },
+    }
+
+
+def get_system_pricing_static(document: HtmlElement) -> list:
+    """
+    Get the pricing of the quantum computers from the page's static HTML.
+    The pricing table is the one whose rows all have a price per task and per shot.
+    """
+    for table in document.xpath("//table"):
+        rows = [
+            list(map(element_text, row.xpath("./td")))
+            for row in table.xpath(".//tr")
+        ]
+        # ignoramos la fila de encabezados
+        rows = [fila for fila in rows[1:] if fila]
+        if not rows:
+            continue
+        try:
+            return [build_system_price(fila) for fila in rows]
+        except (IndexError, ValueError):
+            continue
+    raise NeedsBrowser("pricing table not found in the static HTML")
 
 
 def get_system_pricing() -> list:
+    # Primero se intenta sin navegador
+    if quantum_computers := scrape_static(get_system_pricing_static, PRICING_URL):
+        return quantum_computers
     quantum_computers = []
-    with innit_driver("https://aws.amazon.com/es/braket/pricing/") as driver:
-        table = driver.find_element(
-            By.XPATH,
-            '/html/body/div[2]/main/div[3]/div/div/div/ul[2]/li[2]/div/div[2]/table'
+    with innit_driver(PRICING_URL) as driver:
+        if driver is None:
+            raise WebDriverException(f"No webdriver available to scrape {PRICING_URL}")
+        table = WebDriverWait(driver, 10).until(
+            EC.presence_of_element_located((By.XPATH, PRICING_TABLE_XPATH))
         )
         rows = table.find_elements(By.TAG_NAME, "tr")
         # ignoramos la fila de encabezados
         for row in rows[1:]:
-            fila = row.find_elements(By.TAG_NAME, "td")
-            hardware_provider, qpu_family = fila[0].text, fila[1].text
-            per_task_price = float(fila[2].text.split()[0].replace(",", "."))
-            per_shot_price = float(fila[3].text.split()[0].replace(",", "."))
-            quantum_computers.append(
-                {
-                    "hardware_provider": hardware_provider,
-                    "qpu_family": qpu_family,
-                    "price": {
-                        "full_price": f"${str(per_task_price)}/task + ${str(per_shot_price)}/shot",
-                        "per_task_price": per_task_price,
-                        "per_shot_price": per_shot_price,
-                    },
-                }
-            )
+            fila = [cell.text for cell in row.find_elements(By.TAG_NAME, "td")]
+            quantum_computers.append(build_system_price(fila))
     return quantum_computers
 
 
@@ -81,18 +107,19 @@ def get_simulator_pricing() -> list:
     return quantum_circuit_simulators
 
 
-PRECIOS = []
+def fetch_pricing() -> list:
+    """Get the pricing of the quantum computers and the simulators"""
+    if not (quantum_computers := get_system_pricing()):
+        raise ValueError("No se han encontrado precios de sistemas cuanticos")
+    return quantum_computers + get_simulator_pricing()
 
-def get_pricing() -> list:
-    global PRECIOS
-    if not PRECIOS:
-        try:
-            PRECIOS = get_system_pricing() + get_simulator_pricing()
-        except Exception as e:
-            print(f"Error al obtener los precios de AWS Braket: {e}")
-            send_error_mail(e, "Error al obtener los precios de AWS Braket.")
 
-    return PRECIOS
+# Precios compartidos por todos los workers, con caducidad
+braket_pricing = PricingStore("aws_braket", fetch_pricing)
+
+
+def get_pricing() -> list:
+    return braket_pricing.get()
 
 
 def main():
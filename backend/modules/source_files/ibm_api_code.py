@@ -1,70 +1,117 @@
 from typing import Any
 
-import requests
+from utils.http_client import http_client
+from utils.refresh_telemetry import ContextThreadPoolExecutor
 from modules.api_module import APIRequest, get_auth_if_needed
 
+# Peticiones simultaneas contra la API de IBM durante un refresco
+MAX_CONCURRENT_REQUESTS = 8
+# Recursos que se consultan de cada backend
+RESOURCES = ["status", "properties", "configuration"]
 
-def get_backends(request: APIRequest) -> list[dict[str, Any]]:
-    base_url = request.base_url
-    try:
-        auth = get_auth_if_needed(request, provider_key="ibm")
-    except ValueError as err:
-        print("Exception:", err)
-        return []
-    # Obtenemos los backends
+
+def get_resource(url: str, headers: dict) -> dict | None:
+    """Get a resource of a backend, None if the request fails"""
     try:
-        backends = requests.get(
-            f"{base_url}/backends",
-            headers={"Authorization": auth},
-        ).json()["devices"]
-    # IBM está teniendo problemas con sus API Keys, 
-    # a veces hay que regenerarlas porque las antiguas no funcionan 
+        response = http_client.get(url, headers=headers)
+        response.raise_for_status()
+        return response.json()
     except Exception as err:
-        print("Exception:", err)
-        return []
+        print(f"Exception ({url}):", err)
+        return None
+
+
+def build_backend(backend: str, resources: dict[str, dict | None]) -> dict[str, Any]:
+    """
+    Build the output of a backend. If any of its resources could not be
+    fetched, the fields that depend on it are left empty.
+    """
+    status = resources["status"] or {}
+    sys_props = resources["properties"] or {}
+    sys_conf = resources["configuration"] or {}
+
+    # Formateamos la configuración
+    conf = {
+        "basis_gates": sys_conf.get("basis_gates"),
+        "clops_h": sys_conf.get("clops_h"),
+        "credits_required": sys_conf.get("credits_required"),
+        "description": sys_conf.get("description"),
+        "max_experiments": sys_conf.get("max_experiments"),
+        "max_shots": sys_conf.get("max_shots"),
+    }
+
+    # Definimos el esquema de salida
+    return {
+        "provider": None,
+        "backend": backend,
+        "status": status.get("message"),
+        "qubits": sys_conf.get("n_qubits"),
+        "queue": status.get("length_queue"),
+        "last_updated": sys_props.get("last_update_date"),
+        "extra": conf,
+    }
+
+
+def fetch_resources(
+    request: APIRequest, resources: list[str]
+) -> list[tuple[str, dict[str, dict | None]]]:
+    """
+    Get the given resources of every backend, concurrently.
+    Raises if the backends can't be listed (e.g. the API key is not valid).
+
+    Returns:
+    - list[tuple[str, dict]]: The name of every backend and its resources
+    """
+    base_url = request.base_url
+    headers = {"Authorization": get_auth_if_needed(request, provider_key="ibm")}
+    # Obtenemos los backends
+    # IBM está teniendo problemas con sus API Keys, a veces hay que regenerarlas
+    # porque las antiguas no funcionan: el error llega al circuit breaker
+    response = http_client.get(f"{base_url}/backends", headers=headers)
+    response.raise_for_status()
+    backends = response.json()["devices"]
 
-    output = []
     # Los simuladores de IBM serán retirados proximamente, por lo que no se incluirán
     backends = list(filter(lambda back: "simulator" not in back, backends))
-    for backend in backends:
-        # Obtenemos el estado del backend
-        status = requests.get(
-            f"{base_url}/backends/{backend}/status",
-            headers={"Authorization": auth},
-        ).json()
-
-        # Obtenemos las propiedades del backend
-        sys_props = requests.get(
-            f"{base_url}/backends/{backend}/properties",
-            headers={"Authorization": auth},
-        ).json()
-
-        # Obtenemos la configuración del backend
-        sys_conf = requests.get(
-            f"{base_url}/backends/{backend}/configuration",
-            headers={"Authorization": auth},
-        ).json()
-
-        # Formateamos la configuración
-        conf = {
-            "basis_gates": sys_conf["basis_gates"],
-            "clops_h": sys_conf["clops_h"],
-            "credits_required": sys_conf["credits_required"],
-            "description": sys_conf["description"],
-            "max_experiments": sys_conf["max_experiments"],
-            "max_shots": sys_conf["max_shots"],
-        }
 
-        # Definimos el esquema de salida
-        schema = {
-            "provider": None,
-            "backend": backend,
-            "status": status["message"],
-            "qubits": sys_conf["n_qubits"],
-            "queue": status["length_queue"],
-            "last_updated": sys_props["last_update_date"],
-            "extra": conf,
+    # Los recursos de todos los backends a la vez
+    with ContextThreadPoolExecutor(max_workers=MAX_CONCURRENT_REQUESTS) as executor:
+        futures = {
+            (backend, resource): executor.submit(
+                get_resource, f"{base_url}/backends/{backend}/{resource}", headers
+            )
+            for backend in backends
+            for resource in resources
         }
-        output.append(schema)
 
+    return [
+        (
+            backend,
+            {resource: futures[(backend, resource)].result() for resource in resources},
+        )
+        for backend in backends
+    ]
+
+
+def get_status(request: APIRequest) -> list[dict[str, Any]]:
+    """Get only the status and queue of the backends"""
+    output = []
+    for backend, resources in fetch_resources(request, ["status"]):
+        status = resources["status"] or {}
+        output.append(
+            {
+                "provider": None,
+                "backend": backend,
+                "status": status.get("message"),
+                "queue": status.get("length_queue"),
+            }
+        )
     return output
+
+
+def get_backends(request: APIRequest) -> list[dict[str, Any]]:
+    # Estado, propiedades y configuración de todos los backends
+    return [
+        build_backend(backend, resources)
+        for backend, resources in fetch_resources(request, RESOURCES)
+    ]
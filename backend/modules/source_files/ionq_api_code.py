@@ -1,62 +1,132 @@
 from typing import Any
 
-import requests
+from database.mongo_client import db_find_characterizations, db_upsert_characterizations
+from utils.http_client import http_client
+from utils.refresh_telemetry import ContextThreadPoolExecutor
 from modules.api_module import APIRequest, get_auth_if_needed
 
+# Caracterizaciones que se descargan a la vez
+MAX_CONCURRENT_REQUESTS = 4
+# Campos sin los que una caracterizacion no se guarda en la cache
+CHARACTERIZATION_FIELDS = ("qubits", "fidelity")
 
-def process_backend(backend: dict) -> dict:
-    backend_name = backend["backend"]
-    # Si no es un simulador, obtenemos su caracterización
-    if backend_name == "simulator":
-        return backend
-    # Eliminamos el antiguo enlace
-    del backend["characterization_url"]
-    # Recuperamos la caracterización
-    charact: dict = requests.get(
-        f"{backend['characterization_url']}",
-        headers={"Authorization": backend["auth"]},
-    ).json()
+
+def get_characterization_id(backend: dict) -> str | None:
+    """Id of the current characterization, taken from its url"""
+    if url := backend.get("characterization_url"):
+        return url.rstrip("/").split("/")[-1]
+    return None
+
+
+def get_characterization(base_url: str, backend_name: str, auth: str) -> dict:
+    """Download the current characterization of a backend"""
+    response = http_client.get(
+        f"{base_url}/characterizations/backends/{backend_name}/current",
+        headers={"Authorization": auth},
+    )
+    response.raise_for_status()
+    charact: dict = response.json()
     # No me interesa la conectividad
     charact.pop("connectivity", None)
+    return charact
 
 
-def get_backends(request: APIRequest) -> list[dict[str, Any]]:
-    base_url = request.base_url
-    try:
-        auth = get_auth_if_needed(request, provider_key="ionq")
-    except ValueError as err:
-        print("Exception:", err)
-        return []
-    # Obtenemos los backends
-    backends = requests.get(
-        f"{base_url}/backends",
-        params={"status": "verbose"},
-        headers={"Authorization": auth},
-    ).json()
+def get_characterizations(
+    base_url: str, qpus: list[dict], auth: str
+) -> dict[str, dict]:
+    """
+    Get the current characterization of every QPU.
 
-    for idx, backend in enumerate(backends):
-        backend_name = backend["backend"]
-        backend["provider"] = None
-        # Si no es un simulador, obtenemos su caracterización
-        if backend_name == "simulator":
+    Characterizations are cached in the database by backend and
+    characterization id, so they are only downloaded when they change.
+    The ones that are not cached are downloaded concurrently.
+    """
+    ids = {qpu["backend"]: get_characterization_id(qpu) for qpu in qpus}
+    cached = {
+        charact["backend"]: charact["characterization"]
+        for charact in db_find_characterizations(
+            filter={"_id": {"$in": [id for id in ids.values() if id]}}
+        )
+    }
+
+    missing = [name for name in ids if name not in cached]
+    with ContextThreadPoolExecutor(max_workers=MAX_CONCURRENT_REQUESTS) as executor:
+        downloaded = dict(
+            zip(
+                missing,
+                executor.map(
+                    lambda name: get_characterization(base_url, name, auth), missing
+                ),
+            )
+        )
+
+    to_store = []
+    for name, charact in downloaded.items():
+        # Lo que no es una caracterizacion se serviria desde la cache para siempre
+        if not all(field in charact for field in CHARACTERIZATION_FIELDS):
+            print(f"Unexpected characterization of {name}, not cached")
             continue
-        # Eliminamos el antiguo enlace
-        del backends[idx]["characterization_url"]
-        # Recuperamos la caracterización
-        charact: dict = requests.get(
-            f"{base_url}/characterizations/backends/{backend_name}/current",
-            headers={"Authorization": auth},
-        ).json()
-        # No me interesa la conectividad
-        charact.pop("connectivity", None)
+        # El id de la url o, si no viene, el de la propia caracterizacion
+        if charact_id := ids[name] or charact.get("id"):
+            to_store.append(
+                {
+                    "_id": charact_id,
+                    "backend": name,
+                    "date": charact.get("date"),
+                    "characterization": charact,
+                }
+            )
+    if to_store:
+        db_upsert_characterizations(to_store)
+
+    characts = {**cached, **downloaded}
+    for charact in characts.values():
         # No me interesa el id
         charact.pop("id", None)
         # No me interesa otro nombre del backend
         charact.pop("backend", None)
+    return characts
+
+
+def fetch_backends(base_url: str, auth: str) -> list[dict[str, Any]]:
+    """Get the backends, with their status and queue time"""
+    response = http_client.get(
+        f"{base_url}/backends",
+        params={"status": "verbose"},
+        headers={"Authorization": auth},
+    )
+    response.raise_for_status()
+    return response.json()
+
+
+def get_status(request: APIRequest) -> list[dict[str, Any]]:
+    """Get only the status fields of the backends (a single request)"""
+    base_url = request.base_url
+    auth = get_auth_if_needed(request, provider_key="ionq")
+    backends = fetch_backends(base_url, auth)
+    for backend in backends:
+        backend["provider"] = None
+        backend.pop("characterization_url", None)
+    return backends
+
+
+def get_backends(request: APIRequest) -> list[dict[str, Any]]:
+    base_url = request.base_url
+    auth = get_auth_if_needed(request, provider_key="ionq")
+    # Obtenemos los backends (el estado se refresca siempre)
+    backends = fetch_backends(base_url, auth)
+
+    # Si no es un simulador, obtenemos su caracterización
+    qpus = [backend for backend in backends if backend["backend"] != "simulator"]
+    characts = get_characterizations(base_url, qpus, auth)
+
+    for backend in backends:
+        backend["provider"] = None
+        # Eliminamos el antiguo enlace
+        backend.pop("characterization_url", None)
+        if backend["backend"] == "simulator":
+            continue
         # TODO: Formatear la fecha a un formato generico
-        charact["date"] = charact["date"]
         # Insertamos la caracterización
-        backends[idx]["extra"] = {
-            "characterization": charact
-        }
+        backend["extra"] = {"characterization": characts[backend["backend"]]}
     return backends
@@ -8,17 +8,61 @@ Codigo para obtener la informacion de los QPUs de Rigetti
 - ``find_qpu_buttons``: Encuentra los botones de las QPUs disponibles
 - ``get_page_info``: Obtiene la informacion de la pagina
 - ``get_descriptions``: Obtiene las descripciones de los backends (para almacenar en el proveedor)
-- ``get_backends``: Reune la informacion de todos los backends
+- ``get_backends``: Reune la informacion de todos los backends (en paralelo si
+``PARALLEL_SESSIONS`` > 1)
+- ``get_backends_static``: Reune la informacion desde el HTML estatico, sin navegador
 """
 
-import time
-
+from lxml.html import HtmlElement
 from selenium import webdriver
+from selenium.common.exceptions import (
+    NoSuchElementException,
+    StaleElementReferenceException,
+)
 from selenium.webdriver.common.by import By
 from selenium.webdriver.remote.webelement import WebElement
+from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.support.relative_locator import locate_with
+from selenium.webdriver.support.ui import WebDriverWait
+
+from modules.scraper_module import (
+    NeedsBrowser,
+    element_text,
+    get_section_static,
+    innit_driver,
+)
+from utils.refresh_telemetry import ContextThreadPoolExecutor
+
+# Tiempo maximo (en segundos) que se espera a que cargue la informacion
+WAIT_TIMEOUT = 10
+# Sesiones de Chrome entre las que se reparten las QPUs (1 = secuencial)
+PARALLEL_SESSIONS = 1
+
+PROPERTIES_XPATH = '//*[@id="app-layout"]/main/div/div/div[2]/div[2]'
+
+
+def wait(driver: webdriver.Chrome) -> WebDriverWait:
+    # Mientras React vuelve a pintar la pagina, los elementos pueden desaparecer
+    return WebDriverWait(
+        driver,
+        WAIT_TIMEOUT,
+        poll_frequency=0.1,
+        ignored_exceptions=[NoSuchElementException, StaleElementReferenceException],
+    )
+
+
+def wait_for_page(driver: webdriver.Chrome):
+    """Wait until the information of a QPU is shown"""
+    wait(driver).until(EC.presence_of_element_located((By.XPATH, PROPERTIES_XPATH)))
+    wait(driver).until(lambda d: d.find_element(By.TAG_NAME, "h2").text.strip())
+
 
-from modules.scraper_module import innit_driver
+def select_qpu(driver: webdriver.Chrome, button: WebElement):
+    """Click the button of another QPU and wait until its information is shown"""
+    previous_name = get_qpu_name(driver)
+    button.click()
+    wait(driver).until(lambda d: get_qpu_name(d) != previous_name)
+    wait_for_page(driver)
 
 
 def get_qpu_name(driver: webdriver.Chrome) -> str:
@@ -27,7 +71,7 @@ def get_qpu_name(driver: webdriver.Chrome) -> str:
 
 def get_properties(driver: webdriver.Chrome) -> tuple[dict, dict]:
     system_props, performance_snapshot = driver.find_element(
-        By.XPATH, '//*[@id="app-layout"]/main/div/div/div[2]/div[2]'
+        By.XPATH, PROPERTIES_XPATH
     ).find_elements(By.TAG_NAME, "div")
 
     # System
@@ -47,16 +91,18 @@ def get_properties(driver: webdriver.Chrome) -> tuple[dict, dict]:
     return system_props_dict, performance_dict
 
 
-def find_qpu_buttons(driver: webdriver.Chrome) -> list[WebElement]:
-    try:
-        locator = locate_with(
-            By.XPATH, '//*[@id="app-layout"]/main/div/div/div[1]/div'
-        ).near(driver.find_element(By.TAG_NAME, "h2"))
-        div_qpus = driver.find_element(locator)
+# Contenedor de los botones de las QPUs
+QPU_BUTTONS_XPATH = '//*[@id="app-layout"]/main/div/div/div[1]/div//button'
 
-        return div_qpus.find_elements(By.TAG_NAME, "button")
-    except Exception:
-        return []
+
+def find_qpu_buttons(driver: webdriver.Chrome) -> list[WebElement]:
+    """
+    Wait until the buttons of the QPUs are shown and get them.
+    :raises TimeoutException: if they are not shown, instead of returning no QPUs
+    """
+    return wait(driver).until(
+        EC.presence_of_all_elements_located((By.XPATH, QPU_BUTTONS_XPATH))
+    )
 
 
 def get_page_info(driver: webdriver.Chrome) -> dict:
@@ -69,21 +115,62 @@ def get_page_info(driver: webdriver.Chrome) -> dict:
     }
 
 
-def get_backends(driver: webdriver.Chrome) -> list[dict]:
-    output = [get_page_info(driver)]
-    qpu_buttons: list = find_qpu_buttons(driver)
-    element: WebElement
-    for element in qpu_buttons[1:]:
-        element.click()
-        # Esperamos a que cargue la informaciÃ³n
-        time.sleep(1)
-        output.append(get_page_info(driver))
-    # print(json.dumps(output, ensure_ascii=False))
+def get_backends_in_session(url: str, indices: list[int]) -> dict[int, dict]:
+    """
+    Get the information of some QPUs (by the index of their button)
+    using another session of the pool. Empty if there is no session available.
+    """
+    output = {}
+    with innit_driver(url) as driver:
+        if not driver:
+            return output
+        wait_for_page(driver)
+        for index in indices:
+            select_qpu(driver, find_qpu_buttons(driver)[index])
+            output[index] = get_page_info(driver)
     return output
 
 
+def get_backends(
+    driver: webdriver.Chrome, sessions: int = PARALLEL_SESSIONS
+) -> list[dict]:
+    """
+    Get the information of every QPU in the page.
+    With ``sessions`` > 1, the QPUs are split between that many sessions.
+    """
+    wait_for_page(driver)
+    output = {0: get_page_info(driver)}
+    # La primera QPU es la que ya se muestra
+    indices = list(range(1, len(find_qpu_buttons(driver))))
+    sessions = max(1, min(sessions, len(indices)))
+    # Reparto round-robin, el primer grupo lo recorre la sesion actual
+    groups = [indices[i::sessions] for i in range(sessions)]
+
+    with ContextThreadPoolExecutor(max_workers=max(1, sessions - 1)) as executor:
+        futures = [
+            executor.submit(get_backends_in_session, driver.current_url, group)
+            for group in groups[1:]
+        ]
+        # La sesion actual recorre su grupo mientras las demas hacen lo mismo
+        for index in groups[0]:
+            select_qpu(driver, find_qpu_buttons(driver)[index])
+            output[index] = get_page_info(driver)
+        for future in futures:
+            output.update(future.result())
+        # Las QPUs de las sesiones que no se han podido abrir, con la actual
+        for index in [index for group in groups[1:] for index in group]:
+            if index in output:
+                continue
+            select_qpu(driver, find_qpu_buttons(driver)[index])
+            output[index] = get_page_info(driver)
+    # print(json.dumps(output, ensure_ascii=False))
+    return [output[index] for index in sorted(output)]
+
+
 def get_descriptions(driver: webdriver.Chrome) -> dict:
     description: dict[str, str | list] = {"provider": [], "backends": []}
+    wait_for_page(driver)
+    wait(driver).until(EC.presence_of_element_located((By.ID, "qpu_spec_charts")))
     locator = locate_with(By.TAG_NAME, "p").above(
         driver.find_element(By.ID, "qpu_spec_charts")
     )
@@ -92,10 +179,10 @@ def get_descriptions(driver: webdriver.Chrome) -> dict:
 
     description.update({"provider": [first.text] + list(map(lambda e: e.text, last))})
 
-    for button in find_qpu_buttons(driver):
-        button.click()
-        # Esperamos a que cargue la informaciÃ³n
-        time.sleep(1)
+    for index in range(len(find_qpu_buttons(driver))):
+        # La primera QPU es la que ya se muestra
+        if index:
+            select_qpu(driver, find_qpu_buttons(driver)[index])
         _, change, *_ = driver.find_elements(locator)[::-1]
         description["backends"].append(
             {"name": get_qpu_name(driver), "description": change.text}
@@ -104,6 +191,35 @@ def get_descriptions(driver: webdriver.Chrome) -> dict:
     # print(json.dumps({"descriptions": description}, ensure_ascii=False))
     return description
 
+
+# region Static HTML (sin navegador)
+
+
+def get_backends_static(document: HtmlElement) -> list[dict]:
+    """
+    Get the properties of the QPU from the page's static HTML.
+    Only possible when the page shows a single QPU, the rest are loaded by clicking.
+    """
+    # El resto de QPUs solo se cargan al pulsar sus botones
+    if len(document.xpath(QPU_BUTTONS_XPATH)) > 1:
+        raise NeedsBrowser("the page shows several QPUs")
+    container = document.xpath(PROPERTIES_XPATH)
+    titles = document.xpath("//h2")
+    if not container or not titles:
+        raise NeedsBrowser("the QPU is not in the static HTML")
+    system_props, performance_snapshot = container[0].xpath(".//div")
+    return [
+        {
+            "backend": element_text(titles[0]).split()[0],
+            **get_section_static(system_props),
+            **get_section_static(performance_snapshot),
+        }
+    ]
+
+
+# endregion
+
+
 def main():
     with innit_driver("https://qcs.rigetti.com/qpus") as driver:
         backends: list = get_backends(driver)
@@ -8,13 +8,38 @@ Codigo para obtener la informacion de los QPUs de Rigetti
 - ``get_page_info``: Obtiene la informacion de la pagina
 - ``get_descriptions``: Obtiene las descripciones del backend (para almacenar en el proveedor)
 - ``get_backends``: Reune la informacion del backend
+- ``get_backends_static``: Reune la informacion desde el HTML estatico, sin navegador
 """
 
+from lxml.html import HtmlElement
 from selenium import webdriver
 from selenium.webdriver.common.by import By
+from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.support.relative_locator import locate_with
+from selenium.webdriver.support.ui import WebDriverWait
 
-from modules.scraper_module import innit_driver
+from modules.scraper_module import (
+    NeedsBrowser,
+    element_text,
+    get_section_static,
+    innit_driver,
+)
+
+
+# Tiempo maximo (en segundos) que se espera a que cargue la informacion
+WAIT_TIMEOUT = 10
+
+PROPERTIES_XPATH = '//*[@id="app-layout"]/main/div/div/div[1]/div[2]'
+
+
+def wait_for_page(driver: webdriver.Chrome):
+    """Wait until the information of the QPU is shown"""
+    WebDriverWait(driver, WAIT_TIMEOUT).until(
+        EC.presence_of_element_located((By.XPATH, PROPERTIES_XPATH))
+    )
+    WebDriverWait(driver, WAIT_TIMEOUT).until(
+        lambda d: d.find_element(By.TAG_NAME, "h2").text.strip()
+    )
 
 
 def get_qpu_name(driver: webdriver.Chrome) -> str:
@@ -25,7 +50,7 @@ def get_qpu_name(driver: webdriver.Chrome) -> str:
 def get_properties(driver: webdriver.Chrome) -> tuple[dict, dict]:
     """Get the properties of the QPU from the page"""
     system_props, performance_snapshot = driver.find_element(
-        By.XPATH, '//*[@id="app-layout"]/main/div/div/div[1]/div[2]'
+        By.XPATH, PROPERTIES_XPATH
     ).find_elements(By.TAG_NAME, "div")
 
     # System
@@ -59,6 +84,7 @@ def get_backends(driver: webdriver.Chrome) -> list[dict]:
     """
     Get the properties of the QPU in the page
     """
+    wait_for_page(driver)
     output = [get_page_info(driver)]
     # print(json.dumps(output, ensure_ascii=False))
     return output
@@ -70,6 +96,10 @@ def get_descriptions(driver: webdriver.Chrome) -> dict:
     Get the descriptions of the QPU in the page
     """
     description: dict[str, str | list] = {"provider": [], "backends": []}
+    wait_for_page(driver)
+    WebDriverWait(driver, WAIT_TIMEOUT).until(
+        EC.presence_of_element_located((By.ID, "qpu_spec_charts"))
+    )
     locator = locate_with(By.TAG_NAME, "p").above(
         driver.find_element(By.ID, "qpu_spec_charts")
     )
@@ -88,6 +118,30 @@ def get_descriptions(driver: webdriver.Chrome) -> dict:
     return description
 
 
+# region Static HTML (sin navegador)
+
+
+def get_backends_static(document: HtmlElement) -> list[dict]:
+    """
+    Get the properties of the QPU from the page's static HTML.
+    """
+    container = document.xpath(PROPERTIES_XPATH)
+    titles = document.xpath("//h2")
+    if not container or not titles:
+        raise NeedsBrowser("the QPU is not in the static HTML")
+    system_props, performance_snapshot = container[0].xpath(".//div")
+    return [
+        {
+            "backend": element_text(titles[0]).split()[0],
+            **get_section_static(system_props),
+            **get_section_static(performance_snapshot),
+        }
+    ]
+
+
+# endregion
+
+
 def main():
 
     with innit_driver("https://qcs.rigetti.com/qpus") as driver:
@@ -1,19 +1,28 @@
 from typing import Annotated
 
-from utils.scheduler_functions import refresh_backends
-from database.models.backends_models import Backend, retrieve_backend
-from database.mongo_client import (
+from utils.scheduler_functions import start_refresh_run
+from database.backend_cache import (
+    UnsupportedQuery,
+    backend_catalog,
+    find_by_bid,
+    find_in_catalog,
+)
+from database.models.backends_models import serialize_backend
+from database.async_mongo_client import (
     db_find_backend,
     db_find_backends,
     db_find_provider,
     db_find_providers,
+    db_find_refresh_run,
 )
-from fastapi import APIRouter, Body, HTTPException, Path, status
-from fastapi.logger import logger
+from fastapi import APIRouter, Body, HTTPException, Path, Response, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import ORJSONResponse
 from pydantic import BaseModel
 from routers.provider_router import sf_parse_object_id
 
 from database.models.providers_models import BaseProviderModel, ThirdPartyEnum
+from database.models.refresh_models import RefreshRunModel
 
 
 # For documentation purposes
@@ -21,6 +30,13 @@ class HTTPCodeModel(BaseModel):
     detail: str = None
 
 
+class RefreshRunHandle(BaseModel):
+    run_id: str
+    # False si la peticion se ha unido a un refresco ya en curso
+    created: bool
+    status_url: str
+
+
 router = APIRouter(tags=["Systems"], prefix="/backends")
 
 
@@ -37,13 +53,9 @@ async def get_backends() -> list[dict]:
     Get all backends.
     - **returns**: All backends.
     """
-    backends = list(
-        map(
-            lambda b: retrieve_backend(Backend(backend=b), as_dict=True),
-            db_find_backends(),
-        )
-    )
-    return backends
+    # Se devuelve el catalogo ya codificado, sin volver a validarlo
+    snapshot = await backend_catalog.get()
+    return Response(content=snapshot.encoded, media_type="application/json")
 
 
 @router.post(
@@ -75,13 +87,19 @@ async def get_backends_filtered(
     if usingObjectId and usingObjectId.get("usingObjectId"):
         for key, value in filter.items():
             filter[key] = sf_parse_object_id(value)
-    backends = list(
-        map(
-            lambda b: retrieve_backend(Backend(backend=b), as_dict=True),
-            db_find_backends(filter=filter, projection=projection),
+    # Si la consulta se puede resolver en memoria, no se consulta la base de datos
+    try:
+        backends = find_in_catalog(
+            await backend_catalog.get(), filter=filter, projection=projection
         )
-    )
-    return backends
+    except UnsupportedQuery:
+        backends = list(
+            map(
+                serialize_backend,
+                await db_find_backends(filter=filter, projection=projection),
+            )
+        )
+    return ORJSONResponse(backends)
 
 
 @router.get(
@@ -116,12 +134,15 @@ async def get_backend_by_bid(
     - **raises**: HTTPException 400: If the BID does not exist.
     - **raises**: HTTPException 404: If the backend is not found.
     """
+    try:
+        backend = find_by_bid(await backend_catalog.get(), bid, projection)
+    except UnsupportedQuery:
+        backend = await db_find_backend(filter={"bid": bid}, projection=projection)
+        if backend is not None:
+            backend = serialize_backend(backend)
 
-    if (
-        backend := db_find_backend(filter={"bid": bid}, projection=projection)
-    ) is not None:
-        backend = retrieve_backend(Backend(backend=backend), as_dict=True)
-        return backend
+    if backend is not None:
+        return ORJSONResponse(backend)
 
     raise HTTPException(
         status_code=status.HTTP_404_NOT_FOUND, detail=f"Backend with {bid} not found"
@@ -130,19 +151,23 @@ async def get_backend_by_bid(
 
 @router.post(
     "/refresh",
-    description="Refresh backends",
-    status_code=status.HTTP_204_NO_CONTENT,
+    description="Refresh backends (in the background)",
+    response_model=RefreshRunHandle,
+    status_code=status.HTTP_202_ACCEPTED,
+    responses={status.HTTP_404_NOT_FOUND: {"model": HTTPCodeModel}},
 )
 async def refresh_backends_api(
     filter: Annotated[
-        dict, Body(title="Filter", description="Filter the backends", embed=True)
+        dict, Body(title="Filter", description="Filter the providers", embed=True)
     ] = {},
-):
+) -> RefreshRunHandle:
     """
-    Get backends (filtered and/or projected).
-    - **filter**: Filter to query the backends.
-    - **projection**: Filter to select which fields to return.
-    - **returns**: All backends.
+    Start refreshing the backends of the providers matching the filter.
+    If a refresh of the same providers is already in flight, it is joined
+    instead of starting another one.
+    - **filter**: Filter to query the providers.
+    - **returns**: HTTP 202 Accepted: The id of the refresh run.
+    - **raises**: HTTPException 404: If no provider matches the filter.
     """
     if not filter:
         filter.update({"from_third_party": False})
@@ -150,7 +175,7 @@ async def refresh_backends_api(
     if "_id" in filter:
         filter["_id"] = sf_parse_object_id(filter["_id"])
 
-    providers = db_find_providers(filter=filter)
+    providers = await db_find_providers(filter=filter)
     providers = list(map(lambda p: BaseProviderModel(**p), providers))
 
     filtered_providers: list[BaseProviderModel] = []
@@ -159,7 +184,7 @@ async def refresh_backends_api(
     for provider in providers:
         if provider.pid.split(".")[0] in [e.value.lower() for e in ThirdPartyEnum]:
             tp_provider = BaseProviderModel(
-                **db_find_provider(
+                **await db_find_provider(
                     filter={
                         "_id": sf_parse_object_id(provider.third_party.third_party_id)
                     }
@@ -171,6 +196,44 @@ async def refresh_backends_api(
         else:
             filtered_providers.append(provider)
 
-    for provider in filtered_providers:
-        logger.info(f"Processing provider: {provider.name} with id: {provider.id}...")
-        refresh_backends(provider)
+    if not filtered_providers:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="No providers match the filter",
+        )
+
+    # El refresco se ejecuta en segundo plano, fuera del event loop
+    run_id, created = await run_in_threadpool(start_refresh_run, filtered_providers)
+    return RefreshRunHandle(
+        run_id=run_id, created=created, status_url=f"/backends/refresh/{run_id}"
+    )
+
+
+@router.get(
+    "/refresh/{run_id}",
+    description="Get the progress of a refresh run",
+    response_model=RefreshRunModel,
+    response_model_by_alias=False,
+    responses={
+        code: {"model": HTTPCodeModel}
+        for code in [status.HTTP_400_BAD_REQUEST, status.HTTP_404_NOT_FOUND]
+    },
+)
+async def get_refresh_run(
+    run_id: Annotated[str, Path(title="The refresh run id")],
+) -> RefreshRunModel:
+    """
+    Get the status of a refresh run, and of each of its providers.
+
+    - **run_id**: The id returned by ``POST /backends/refresh``.
+    - **returns**: The refresh run.
+    - **raises**: HTTPException 400: If the id is not valid.
+    - **raises**: HTTPException 404: If the refresh run is not found.
+    """
+    if refresh_run := await db_find_refresh_run(filter=sf_parse_object_id(run_id)):
+        return refresh_run
+
+    raise HTTPException(
+        status_code=status.HTTP_404_NOT_FOUND,
+        detail=f"Refresh run with {run_id} not found",
+    )
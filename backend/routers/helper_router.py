@@ -1,7 +1,9 @@
 from typing import Annotated
 
-from database.mongo_client import aggregate, count_documents
+from database.async_mongo_client import aggregate, count_documents, db_find_job_runs
+from database.indexes import check_indexes
 from fastapi import APIRouter, Body, Path, status
+from modules.module_loader import module_loader
 from pydantic import BaseModel
 
 router = APIRouter(tags=["Helpers"], prefix="/helpers")
@@ -35,7 +37,7 @@ async def get_agreggation(
     - **pipeline**: Pipeline to aggregate.
     - **returns**: All providers.
     """
-    return aggregate(collection=collection, pipeline=pipeline)
+    return await aggregate(collection=collection, pipeline=pipeline)
 
 
 @router.get(
@@ -47,7 +49,7 @@ async def get_agreggation(
         status.HTTP_400_BAD_REQUEST: {"model": HTTPCodeModel},
     },
 )
-def count_collection(
+async def count_collection(
     collection: Annotated[
         str,
         Path(
@@ -61,5 +63,44 @@ def count_collection(
     """
     return {
         "message": f"Document count from {collection}",
-        "count": count_documents(collection),
+        "count": await count_documents(collection),
     }
+
+
+@router.get(
+    "/indexes",
+    description="Report of missing, unused and unregistered indexes",
+    response_model=dict,
+)
+def get_indexes_report() -> dict:
+    """
+    Check the database indexes against the index registry.
+    - **returns**: For every collection, the indexes missing, unused and unregistered.
+    """
+    return check_indexes()
+
+
+@router.get(
+    "/module-cache",
+    description="Hits and misses of the fetcher module cache",
+    response_model=dict,
+)
+async def get_module_cache_stats() -> dict:
+    """
+    Get the counters of the fetcher module cache.
+    - **returns**: The hits, misses and number of cached modules.
+    """
+    return module_loader.stats()
+
+
+@router.get(
+    "/scheduler-jobs",
+    description="Last and next run of the scheduled jobs",
+    response_model=list[dict],
+)
+async def get_scheduler_jobs() -> list[dict]:
+    """
+    Get the run record of every scheduled job.
+    - **returns**: For every job, its last run, how it went and its next run.
+    """
+    return await db_find_job_runs()
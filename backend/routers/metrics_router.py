@@ -0,0 +1,54 @@
+from typing import Annotated, Literal
+
+from database.async_mongo_client import db_find_latest_refresh_runs
+from fastapi import APIRouter, Query, Response
+from utils.metrics import metrics_response
+from utils.refresh_telemetry import summarize_runs
+
+router = APIRouter(tags=["Metrics"], prefix="/metrics")
+
+
+@router.get(
+    "",
+    description="Metrics of the app, in the Prometheus text format",
+    response_class=Response,
+)
+def get_metrics() -> Response:
+    """
+    Get the latency of the requests, the database and the providers,
+    and the state of the scheduler, to be scraped by Prometheus.
+    """
+    return metrics_response()
+
+
+@router.get(
+    "/refresh",
+    description="Percentiles of the durations of the latest refresh runs",
+    response_model=dict,
+)
+async def get_refresh_metrics(
+    runs: Annotated[
+        int, Query(title="Runs", description="Number of latest runs", ge=1, le=1000)
+    ] = 50,
+    trigger: Annotated[
+        Literal["api", "scheduler"],
+        Query(title="Trigger", description="Only the runs started this way"),
+    ] = None,
+) -> dict:
+    """
+    Get the percentiles (p50, p90, p99, max) of the latest finished refresh runs.
+    - **runs**: How many of the latest runs to include.
+    - **trigger**: Only the runs started by the API or by the scheduler.
+    - **returns**: The duration of the runs and of their stages (pricing), and for
+    every provider (slowest first) its statuses, duration, stage durations
+    (module_load, fetch, normalize, db_write), backends, bytes fetched and errors.
+    """
+    filter = {"status": "finished"}
+    if trigger:
+        filter["trigger"] = trigger
+    latest = await db_find_latest_refresh_runs(
+        filter=filter,
+        projection={"duration": 1, "stages": 1, "providers": 1},
+        limit=runs,
+    )
+    return summarize_runs(latest)
@@ -8,7 +8,7 @@ from utils.utils import get_current_datetime, norm_str
 from database.models.providers_models import (
     BaseProviderModel,
 )
-from database.mongo_client import (
+from database.async_mongo_client import (
     db_find_provider,
     db_find_providers,
     db_insert_provider,
@@ -39,7 +39,7 @@ async def get_providers() -> list[BaseProviderModel]:
     Get all providers.
     - **returns**: All providers.
     """
-    return db_find_providers()
+    return await db_find_providers()
 
 
 @router.post(
@@ -64,7 +64,7 @@ async def get_providers_filtered(
     - **projection**: Filter to select which fields to return.
     - **returns**: All providers.
     """
-    return db_find_providers(filter=filter, projection=projection)
+    return await db_find_providers(filter=filter, projection=projection)
 
 
 @router.get(
@@ -101,7 +101,7 @@ async def get_provider(
     """
 
     if (
-        provider := db_find_provider(filter={"pid": pid}, projection=projection)
+        provider := await db_find_provider(filter={"pid": pid}, projection=projection)
     ) is not None:
         return provider
 
@@ -137,7 +137,7 @@ async def post_provider(provider: BaseProviderModel = Body(...)) -> BaseProvider
             provider.pid = ".".join([norm_str(provider.third_party), provider_name])
         else:
             provider.pid = ".".join(["native", provider_name])
-    if db_find_provider(filter={"pid": provider.pid}):
+    if await db_find_provider(filter={"pid": provider.pid}):
         raise HTTPException(
             status_code=status.HTTP_409_CONFLICT, detail="El proveedor ya existe"
         )
@@ -146,8 +146,8 @@ async def post_provider(provider: BaseProviderModel = Body(...)) -> BaseProvider
 
     provider_dict["last_checked"] = get_current_datetime()
 
-    provider_db_id = db_insert_provider(provider_dict)
-    provider_db = db_find_provider(filter=sf_parse_object_id(provider_db_id))
+    provider_db_id = await db_insert_provider(provider_dict)
+    provider_db = await db_find_provider(filter=sf_parse_object_id(provider_db_id))
 
     return provider_db
 
@@ -186,7 +186,7 @@ async def update_provider(
     provider_dict = provider.model_dump(exclude=["id"])
 
     provider_dict["last_checked"] = get_current_datetime()
-    doc_after = db_replace_provider(filter={"pid": pid}, replacement=provider_dict)
+    doc_after = await db_replace_provider(filter={"pid": pid}, replacement=provider_dict)
 
     if not doc_after:
         raise HTTPException(
@@ -233,7 +233,7 @@ async def modify_provider(
     provider.pop("_id", None)
 
     if len(provider) >= 1:
-        update_result = db_update_provider(
+        update_result = await db_update_provider(
             filter={"pid": pid},
             cambios={"$set": provider},
         )
@@ -270,7 +270,7 @@ async def delete_provider(
     - **returns**: HTTP 204 No Content
     - **raises**: HTTPException 404: If the provider is not found.
     """
-    if db_delete_provider(filter={"pid": pid}):
+    if await db_delete_provider(filter={"pid": pid}):
         return Response(status_code=status.HTTP_204_NO_CONTENT)
 
     raise HTTPException(status_code=404, detail=f"Provider with {pid} not found")
@@ -0,0 +1,160 @@
+"""
+Circuit breaker de las llamadas a los proveedores (uno por proveedor y tipo
+de llamada: refresco completo o solo el estado).
+
+Cuando un proveedor falla varias veces seguidas (claves caducadas, Chrome que
+no arranca, web caida...) se deja de llamar durante un tiempo, en lugar de
+esperar su timeout en cada refresco:
+- ``closed``: se llama con normalidad y se cuentan los fallos seguidos
+- ``open``: tras ``CIRCUIT_FAILURE_THRESHOLD`` fallos no se llama hasta que
+  pasa el tiempo de espera, que se duplica cada vez que se vuelve a abrir
+  (hasta ``CIRCUIT_MAX_COOLDOWN``)
+- ``half_open``: pasado el tiempo de espera, una sola llamada de prueba;
+  si va bien se cierra, si falla se vuelve a abrir
+
+El estado se guarda en la base de datos, asi lo comparten todos los workers,
+y solo se avisa por correo cuando el circuito se abre, no en cada fallo.
+"""
+
+from datetime import timedelta
+
+from database.mongo_client import config, db_find_circuit, db_update_circuit
+from fastapi.logger import logger
+from utils.email_utils import send_error_mail
+from utils.utils import get_current_datetime
+
+# Fallos seguidos tras los que se deja de llamar al proveedor
+CIRCUIT_FAILURE_THRESHOLD = int(config.get("CIRCUIT_FAILURE_THRESHOLD", 3))
+# Segundos sin llamar al proveedor la primera vez que se abre el circuito
+CIRCUIT_BASE_COOLDOWN = float(config.get("CIRCUIT_BASE_COOLDOWN", 5 * 60))
+CIRCUIT_MAX_COOLDOWN = float(config.get("CIRCUIT_MAX_COOLDOWN", 6 * 60 * 60))
+# Segundos tras los que una llamada de prueba se da por abandonada
+CIRCUIT_PROBE_TIMEOUT = float(config.get("CIRCUIT_PROBE_TIMEOUT", 10 * 60))
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    """The provider is failing, so it is not called for now"""
+
+
+class CircuitBreaker:
+    """Circuit breaker shared by every worker, with exponential backoff"""
+
+    def __init__(
+        self,
+        circuit_id: str,
+        *,
+        threshold: int = CIRCUIT_FAILURE_THRESHOLD,
+        base_cooldown: float = CIRCUIT_BASE_COOLDOWN,
+        max_cooldown: float = CIRCUIT_MAX_COOLDOWN,
+        probe_timeout: float = CIRCUIT_PROBE_TIMEOUT,
+    ):
+        """
+        :param circuit_id: the id of the circuit in the database
+        """
+        self.circuit_id = circuit_id
+        self.threshold = threshold
+        self.base_cooldown = base_cooldown
+        self.max_cooldown = max_cooldown
+        self.probe_timeout = probe_timeout
+
+    def cooldown(self, opens: int) -> float:
+        """Seconds without calling, the ``opens``-th time in a row it opens"""
+        return min(self.base_cooldown * 2 ** (opens - 1), self.max_cooldown)
+
+    def before_call(self):
+        """
+        Check whether the provider can be called now.
+        :raises CircuitOpenError: if it can't (the circuit is open, or another
+        call is already probing it)
+        """
+        circuit = db_find_circuit(self.circuit_id)
+        state = circuit.get("state", CLOSED) if circuit else CLOSED
+        if state == CLOSED:
+            return
+        now = get_current_datetime()
+        until = circuit.get("until")
+        if until and until > now:
+            raise CircuitOpenError(
+                f"Circuit of {self.circuit_id} {state} until {until}"
+            )
+        # Se acabo la espera (o la prueba se abandono): solo una llamada prueba
+        probe = db_update_circuit(
+            self.circuit_id,
+            {
+                "$set": {
+                    "state": HALF_OPEN,
+                    "until": now + timedelta(seconds=self.probe_timeout),
+                }
+            },
+            expected={"state": state, "until": until},
+        )
+        if probe is None:
+            raise CircuitOpenError(f"Circuit of {self.circuit_id} is being probed")
+        logger.info(f"Circuit of {self.circuit_id} half-open, probing it")
+
+    def record_success(self):
+        # Solo se escribe si habia algo que reiniciar
+        circuit = db_update_circuit(
+            self.circuit_id,
+            {
+                "$set": {
+                    "state": CLOSED,
+                    "failures": 0,
+                    "opens": 0,
+                    "until": None,
+                    "last_error": None,
+                    "last_success_at": get_current_datetime(),
+                }
+            },
+            expected={"$or": [{"state": {"$ne": CLOSED}}, {"failures": {"$gt": 0}}]},
+        )
+        if circuit is not None:
+            logger.info(f"Circuit of {self.circuit_id} closed")
+
+    def record_failure(self, error: Exception | str):
+        now = get_current_datetime()
+        circuit = db_update_circuit(
+            self.circuit_id,
+            {
+                "$inc": {"failures": 1},
+                "$set": {"last_error": str(error), "last_failure_at": now},
+                "$setOnInsert": {"state": CLOSED, "opens": 0},
+            },
+            upsert=True,
+        )
+        state, failures = circuit["state"], circuit["failures"]
+        if state == OPEN or (state == CLOSED and failures < self.threshold):
+            return
+
+        opens = circuit["opens"] + 1
+        cooldown = self.cooldown(opens)
+        opened = db_update_circuit(
+            self.circuit_id,
+            {
+                "$set": {
+                    "state": OPEN,
+                    "opens": opens,
+                    "opened_at": now,
+                    "until": now + timedelta(seconds=cooldown),
+                }
+            },
+            expected={"state": state},
+        )
+        if opened is None:
+            # Otro worker ya lo ha abierto
+            return
+        logger.warning(
+            f"Circuit of {self.circuit_id} open for {cooldown} seconds "
+            f"after {failures} failures: {error}"
+        )
+        # Un solo correo por caida, no uno por cada fallo o prueba
+        if state == CLOSED:
+            send_error_mail(
+                error,
+                f"{self.circuit_id} ha fallado {failures} veces seguidas, "
+                f"no se le llamara en {cooldown} segundos.",
+            )
@@ -0,0 +1,116 @@
+"""
+Cliente HTTP compartido por todo el proceso.
+
+- Reutiliza las conexiones (keep-alive) con un pool por cada host
+- Aplica timeouts de conexion y lectura por defecto
+- Reintenta los verbos idempotentes con backoff exponencial y jitter
+- Limita las peticiones simultaneas a un mismo host
+"""
+
+import os
+import threading
+import time
+from contextlib import contextmanager
+from http.cookiejar import DefaultCookiePolicy
+from urllib.parse import urlsplit
+
+import requests
+from dotenv import dotenv_values
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from utils.metrics import record_upstream
+from utils.refresh_telemetry import count_bytes
+
+env = {
+    **dotenv_values(),
+    **os.environ
+}
+
+HTTP_CONNECT_TIMEOUT = float(env.get("HTTP_CONNECT_TIMEOUT", 5))
+HTTP_READ_TIMEOUT = float(env.get("HTTP_READ_TIMEOUT", 30))
+# Conexiones que se mantienen abiertas por host
+HTTP_POOL_SIZE = int(env.get("HTTP_POOL_SIZE", 10))
+HTTP_MAX_RETRIES = int(env.get("HTTP_MAX_RETRIES", 3))
+# Peticiones simultaneas permitidas contra un mismo host
+HTTP_HOST_CONCURRENCY = int(env.get("HTTP_HOST_CONCURRENCY", 8))
+
+# Solo se reintentan los verbos que se pueden repetir sin efectos secundarios
+IDEMPOTENT_METHODS = frozenset(["GET", "HEAD", "OPTIONS", "PUT", "DELETE"])
+RETRY_STATUSES = frozenset([429, 500, 502, 503, 504])
+
+
+class HTTPClient(requests.Session):
+    """
+    ``requests.Session`` with connection pooling, default timeouts,
+    retries on idempotent verbs and a concurrency cap per host.
+    """
+
+    def __init__(
+        self,
+        *,
+        pool_size: int = HTTP_POOL_SIZE,
+        max_retries: int = HTTP_MAX_RETRIES,
+        host_concurrency: int = HTTP_HOST_CONCURRENCY,
+        timeout: tuple[float, float] = (HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT),
+    ):
+        super().__init__()
+        retry = Retry(
+            total=max_retries,
+            backoff_factor=0.5,
+            backoff_jitter=0.5,
+            status_forcelist=RETRY_STATUSES,
+            allowed_methods=IDEMPOTENT_METHODS,
+            respect_retry_after_header=True,
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(
+            pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry
+        )
+        self.mount("https://", adapter)
+        self.mount("http://", adapter)
+        # El cliente se comparte entre usuarios, no debe guardar cookies
+        self.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+
+        self.timeout = timeout
+        self.host_concurrency = host_concurrency
+        self.host_semaphores: dict[str, threading.BoundedSemaphore] = {}
+        self.host_semaphores_lock = threading.Lock()
+
+    @contextmanager
+    def host_slot(self, url: str):
+        """Waits for a free slot of the host of the url"""
+        host = urlsplit(url).netloc
+        with self.host_semaphores_lock:
+            if host not in self.host_semaphores:
+                self.host_semaphores[host] = threading.BoundedSemaphore(
+                    self.host_concurrency
+                )
+            semaphore = self.host_semaphores[host]
+        with semaphore:
+            yield
+
+    def request(self, method: str, url: str, *args, **kwargs) -> requests.Response:
+        kwargs.setdefault("timeout", self.timeout)
+        with self.host_slot(url):
+            start = time.perf_counter()
+            try:
+                response = super().request(method, url, *args, **kwargs)
+            except requests.RequestException as e:
+                record_upstream(
+                    url, "http", time.perf_counter() - start, type(e).__name__
+                )
+                raise
+        record_upstream(
+            url,
+            "http",
+            time.perf_counter() - start,
+            f"http_{response.status_code}" if response.status_code >= 400 else None,
+        )
+        # Las respuestas en streaming no se leen aqui
+        if not kwargs.get("stream"):
+            count_bytes(len(response.content))
+        return response
+
+
+# Cliente compartido por todo el proceso
+http_client = HTTPClient()
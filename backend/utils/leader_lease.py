@@ -0,0 +1,137 @@
+"""
+Eleccion de un lider entre todos los workers (y replicas) de la app.
+
+El lider es quien tiene el lease guardado en la base de datos, y solo el
+ejecuta el trabajo programado (el scheduler). Mientras vive lo renueva cada
+``LEADER_HEARTBEAT_INTERVAL`` segundos; si muere, el lease caduca pasados
+``LEADER_LEASE_TTL`` segundos y otro worker lo toma.
+
+Cada vez que el lease cambia de manos se incrementa su ``token`` (fencing
+token), asi un lider que ha perdido el lease sin enterarse (p.ej. tras una
+pausa larga) no puede hacerse pasar por el actual: ``check`` lo comprueba
+contra la base de datos antes de empezar un trabajo.
+"""
+
+import threading
+from functools import wraps
+from typing import Callable
+
+from database.mongo_client import (
+    config,
+    db_acquire_lease,
+    db_check_lease,
+    db_release_lease,
+    db_renew_lease,
+)
+from fastapi.logger import logger
+from utils.utils import PROCESS_ID
+
+LEADER_LEASE_ID = "scheduler_leader"
+# Segundos tras el ultimo heartbeat en los que el lease caduca
+LEADER_LEASE_TTL = float(config.get("LEADER_LEASE_TTL", 30))
+# Cada cuantos segundos se renueva (o se intenta tomar) el lease
+LEADER_HEARTBEAT_INTERVAL = float(config.get("LEADER_HEARTBEAT_INTERVAL", 10))
+
+
+class LeaderLease:
+    """Leader election through a lease with heartbeats and fencing tokens"""
+
+    def __init__(
+        self,
+        lease_id: str = LEADER_LEASE_ID,
+        *,
+        ttl: float = LEADER_LEASE_TTL,
+        interval: float = LEADER_HEARTBEAT_INTERVAL,
+    ):
+        self.lease_id = lease_id
+        self.ttl = ttl
+        self.interval = interval
+        # Fencing token del lease mientras se tiene, None si no se es lider
+        self.token: int = None
+        self.on_acquired: Callable[[], None] = None
+        self.on_lost: Callable[[], None] = None
+        self.stopped = threading.Event()
+        self.thread: threading.Thread = None
+
+    @property
+    def is_leader(self) -> bool:
+        return self.token is not None
+
+    def check(self) -> bool:
+        """Whether this process is still the leader, asking the database"""
+        token = self.token
+        if token is None:
+            return False
+        return db_check_lease(self.lease_id, owner=PROCESS_ID, token=token)
+
+    def heartbeat(self):
+        """Renew the lease if held, try to take it otherwise"""
+        if self.is_leader:
+            lease = db_renew_lease(
+                self.lease_id, owner=PROCESS_ID, token=self.token, ttl=self.ttl
+            )
+            if lease is None:
+                logger.warning(f"Leadership lost (token {self.token})")
+                self.token = None
+                self.notify(self.on_lost)
+            return
+        lease = db_acquire_lease(self.lease_id, owner=PROCESS_ID, ttl=self.ttl)
+        if lease is not None:
+            self.token = lease["token"]
+            logger.info(f"Leadership acquired by {PROCESS_ID} (token {self.token})")
+            self.notify(self.on_acquired)
+
+    @staticmethod
+    def notify(callback: Callable[[], None]):
+        # En otro hilo, para no retrasar los heartbeats
+        if callback:
+            threading.Thread(
+                target=callback, name="leader-callback", daemon=True
+            ).start()
+
+    def run(self):
+        while not self.stopped.is_set():
+            try:
+                self.heartbeat()
+            except Exception as e:
+                # Sin base de datos no se puede saber si se sigue siendo lider
+                logger.error(f"Leader lease heartbeat failed: {e}")
+                if self.is_leader:
+                    self.token = None
+                    self.notify(self.on_lost)
+            self.stopped.wait(self.interval)
+
+    def start(self):
+        self.stopped.clear()
+        self.thread = threading.Thread(
+            target=self.run, name="leader-lease", daemon=True
+        )
+        self.thread.start()
+
+    def stop(self):
+        """Stop the heartbeats and hand over the lease, if held"""
+        self.stopped.set()
+        if self.thread:
+            self.thread.join(self.interval)
+        if (token := self.token) is not None:
+            self.token = None
+            if self.on_lost:
+                self.on_lost()
+            db_release_lease(self.lease_id, owner=PROCESS_ID, token=token)
+
+
+# Lease compartido por todo el proceso
+leader_lease = LeaderLease()
+
+
+def leader_only(func: Callable) -> Callable:
+    """Scheduled job that only runs if this process is (still) the leader"""
+
+    @wraps(func)
+    def job(*args, **kwargs):
+        if not leader_lease.check():
+            logger.warning(f"Skipping '{func.__name__}', not the leader")
+            return None
+        return func(*args, **kwargs)
+
+    return job
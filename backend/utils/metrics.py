@@ -0,0 +1,212 @@
+"""
+Metricas de la app en formato Prometheus (``GET /metrics``).
+
+- Latencia de las peticiones por ruta, y peticiones en curso
+- Latencia de los comandos de la base de datos por coleccion y operacion
+  (de ambos clientes, a traves de su ``event_listeners``)
+- Latencia y errores de las llamadas a los proveedores por host
+  (``http_client`` y las paginas cargadas con webdriver)
+- Trabajos del scheduler (programados y en ejecucion) y proveedores
+  esperando a ser refrescados
+
+Si la app se ejecuta con varios workers, se ha de definir
+``PROMETHEUS_MULTIPROC_DIR`` para que ``/metrics`` junte los de todos.
+"""
+
+import os
+import threading
+import time
+from urllib.parse import urlsplit
+
+from apscheduler.events import (
+    EVENT_ALL_JOBS_REMOVED,
+    EVENT_JOB_ADDED,
+    EVENT_JOB_ERROR,
+    EVENT_JOB_EXECUTED,
+    EVENT_JOB_REMOVED,
+    EVENT_JOB_SUBMITTED,
+    SchedulerEvent,
+)
+from apscheduler.schedulers.base import BaseScheduler
+from fastapi import Request, Response
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+from pymongo import monitoring
+
+# Las llamadas a los proveedores pueden tardar bastante mas que el resto
+UPSTREAM_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+HTTP_REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds",
+    "Latency of the requests served, by route",
+    ["method", "route", "status"],
+)
+HTTP_REQUESTS_IN_PROGRESS = Gauge(
+    "http_requests_in_progress",
+    "Requests being served",
+    ["method"],
+    multiprocess_mode="livesum",
+)
+DB_COMMAND_DURATION = Histogram(
+    "db_command_duration_seconds",
+    "Latency of the database commands, by collection and operation",
+    ["collection", "operation"],
+)
+DB_COMMAND_ERRORS = Counter(
+    "db_command_errors_total",
+    "Failed database commands, by collection and operation",
+    ["collection", "operation"],
+)
+UPSTREAM_REQUEST_DURATION = Histogram(
+    "upstream_request_duration_seconds",
+    "Latency of the calls to the providers, by host",
+    ["host", "client"],
+    buckets=UPSTREAM_BUCKETS,
+)
+UPSTREAM_ERRORS = Counter(
+    "upstream_errors_total",
+    "Failed calls to the providers, by host and error",
+    ["host", "client", "error"],
+)
+SCHEDULER_JOBS = Gauge(
+    "scheduler_jobs",
+    "Jobs in the scheduler",
+    multiprocess_mode="livesum",
+)
+SCHEDULER_JOBS_RUNNING = Gauge(
+    "scheduler_jobs_running",
+    "Scheduled jobs running",
+    multiprocess_mode="livesum",
+)
+REFRESH_PROVIDERS_QUEUED = Gauge(
+    "refresh_providers_queued",
+    "Providers waiting for a free slot to be refreshed",
+    multiprocess_mode="livesum",
+)
+
+
+def metrics_registry() -> CollectorRegistry:
+    """The registry to export, with the metrics of every worker if there are several"""
+    if "PROMETHEUS_MULTIPROC_DIR" not in os.environ:
+        return REGISTRY
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return registry
+
+
+def metrics_response() -> Response:
+    return Response(
+        content=generate_latest(metrics_registry()), media_type=CONTENT_TYPE_LATEST
+    )
+
+
+# region Requests
+
+
+async def metrics_middleware(request: Request, call_next) -> Response:
+    """Measure every request, labelled by its route template (not its path)"""
+    method = request.method
+    HTTP_REQUESTS_IN_PROGRESS.labels(method).inc()
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        HTTP_REQUESTS_IN_PROGRESS.labels(method).dec()
+        # La ruta se conoce una vez resuelta, las que no existen se agrupan
+        route = request.scope.get("route")
+        HTTP_REQUEST_DURATION.labels(
+            method, route.path if route else "unmatched", str(status)
+        ).observe(time.perf_counter() - start)
+
+
+# region Database
+
+
+class CommandMetrics(monitoring.CommandListener):
+    """Times every command sent to the database"""
+
+    def __init__(self):
+        # request_id -> (coleccion, operacion) de los comandos en curso
+        self.pending: dict[int, tuple[str, str]] = {}
+        self.lock = threading.Lock()
+
+    def started(self, event: monitoring.CommandStartedEvent):
+        # El nombre de la coleccion es el valor del comando (p.ej. {"find": "users"}),
+        # salvo en getMore; los comandos de administracion no tienen
+        collection = event.command.get(
+            "collection" if event.command_name == "getMore" else event.command_name
+        )
+        if not isinstance(collection, str):
+            collection = "-"
+        with self.lock:
+            self.pending[event.request_id] = (collection, event.command_name)
+
+    def finished(self, event) -> tuple[str, str]:
+        with self.lock:
+            labels = self.pending.pop(event.request_id, ("-", event.command_name))
+        DB_COMMAND_DURATION.labels(*labels).observe(event.duration_micros / 1e6)
+        return labels
+
+    def succeeded(self, event: monitoring.CommandSucceededEvent):
+        self.finished(event)
+
+    def failed(self, event: monitoring.CommandFailedEvent):
+        DB_COMMAND_ERRORS.labels(*self.finished(event)).inc()
+
+
+# Listener compartido por los clientes (sincrono y asincrono) de la base de datos
+db_command_metrics = CommandMetrics()
+
+
+# region Upstream
+
+
+def record_upstream(url: str, client: str, seconds: float, error: str = None):
+    """
+    Record a call to a provider.
+    :param client: how it was called, ``http`` or ``webdriver``
+    :param error: the exception or HTTP status, if it failed
+    """
+    host = urlsplit(url).netloc
+    UPSTREAM_REQUEST_DURATION.labels(host, client).observe(seconds)
+    if error:
+        UPSTREAM_ERRORS.labels(host, client, error).inc()
+
+
+# region Scheduler
+
+
+def track_scheduler(scheduler: BaseScheduler):
+    """Keep the scheduler gauges up to date with the events of the scheduler"""
+
+    def on_event(event: SchedulerEvent):
+        if event.code == EVENT_JOB_SUBMITTED:
+            SCHEDULER_JOBS_RUNNING.inc()
+        elif event.code in (EVENT_JOB_EXECUTED, EVENT_JOB_ERROR):
+            # Tras parar el scheduler el gauge ya se ha puesto a cero
+            if not scheduler.running:
+                return
+            SCHEDULER_JOBS_RUNNING.dec()
+        # Los trabajos de una sola vez desaparecen al ejecutarse
+        SCHEDULER_JOBS.set(len(scheduler.get_jobs()))
+
+    scheduler.add_listener(
+        on_event,
+        EVENT_JOB_ADDED
+        | EVENT_JOB_REMOVED
+        | EVENT_ALL_JOBS_REMOVED
+        | EVENT_JOB_SUBMITTED
+        | EVENT_JOB_EXECUTED
+        | EVENT_JOB_ERROR,
+    )
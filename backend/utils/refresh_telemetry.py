@@ -0,0 +1,211 @@
+"""
+Telemetria de los refrescos: cuanto tarda cada etapa del refresco de un
+proveedor (carga del modulo, llamada al proveedor, normalizacion, escritura
+en la base de datos...), cuantos registros y bytes se obtienen.
+
+El refresco de cada proveedor tiene su ``RefreshTelemetry``, que se fija en
+el hilo que lo ejecuta (``recording``). El resto del codigo solo marca sus
+etapas (``stage``) y cuenta lo que procesa (``count``, ``count_bytes``), sin
+saber si se esta midiendo o no.
+
+Las etapas son exclusivas: el tiempo de una etapa dentro de otra solo se
+cuenta en la de dentro, asi la suma de las etapas es el tiempo total.
+
+Los hilos no heredan el ``RefreshTelemetry`` de quien los crea: los pools de
+los modulos han de ser ``ContextThreadPoolExecutor`` para que lo que hacen sus
+hilos (p.ej. los bytes descargados) cuente en el refresco. Las etapas de esos
+hilos se anidan solo dentro de su propio hilo, asi que, al solaparse con las
+del hilo principal, no se descuentan de ellas.
+"""
+
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+from contextvars import ContextVar, copy_context
+
+STAGE_MODULE_LOAD = "module_load"
+STAGE_FETCH = "fetch"
+STAGE_NORMALIZE = "normalize"
+STAGE_DB_WRITE = "db_write"
+STAGE_PRICING = "pricing"
+
+# Errores que se guardan de cada refresco, el resto solo se cuentan
+MAX_ERRORS = 10
+
+
+class RefreshTelemetry:
+    """Stage durations (seconds) and counters of a refresh"""
+
+    def __init__(self):
+        self.stages: dict[str, float] = {}
+        self.counts: dict[str, int] = {}
+        self.bytes_fetched = 0
+        self.errors: list[str] = []
+        # Etapas en curso de cada hilo: [nombre, inicio, tiempo de las de dentro]
+        self.running: dict[int, list[list]] = {}
+        # Los hilos de los pools de los modulos escriben a la vez
+        self.lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, name: str):
+        current = [name, time.perf_counter(), 0.0]
+        with self.lock:
+            running = self.running.setdefault(threading.get_ident(), [])
+        running.append(current)
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - current[1]
+            running.pop()
+            if running:
+                running[-1][2] += elapsed
+            with self.lock:
+                self.stages[name] = self.stages.get(name, 0.0) + elapsed - current[2]
+
+    def count(self, name: str, value: int):
+        with self.lock:
+            self.counts[name] = self.counts.get(name, 0) + value
+
+    def add_bytes(self, value: int):
+        with self.lock:
+            self.bytes_fetched += value
+
+    def add_errors(self, errors: list[str]):
+        self.count("errors", len(errors))
+        with self.lock:
+            self.errors += errors[: MAX_ERRORS - len(self.errors)]
+
+
+current_telemetry: ContextVar[RefreshTelemetry | None] = ContextVar(
+    "current_telemetry", default=None
+)
+
+
+@contextmanager
+def recording(telemetry: RefreshTelemetry):
+    """Record the stages and counters of the current thread in ``telemetry``"""
+    token = current_telemetry.set(telemetry)
+    try:
+        yield telemetry
+    finally:
+        current_telemetry.reset(token)
+
+
+@contextmanager
+def stage(name: str):
+    """Time a stage of the refresh in progress, if any"""
+    if (telemetry := current_telemetry.get()) is None:
+        yield
+        return
+    with telemetry.stage(name):
+        yield
+
+
+def count(name: str, value: int):
+    """Add to a counter of the refresh in progress, if any"""
+    if (telemetry := current_telemetry.get()) is not None:
+        telemetry.count(name, value)
+
+
+def add_errors(errors: list[str]):
+    """Record the errors of the refresh in progress, if any"""
+    if (telemetry := current_telemetry.get()) is not None:
+        telemetry.add_errors(errors)
+
+
+def count_bytes(value: int):
+    """Add to the bytes fetched by the refresh in progress, if any"""
+    if (telemetry := current_telemetry.get()) is not None:
+        telemetry.add_bytes(value)
+
+
+class ContextThreadPoolExecutor(ThreadPoolExecutor):
+    """
+    ``ThreadPoolExecutor`` whose tasks run in a copy of the context of the
+    thread that submits them, so they count in the refresh in progress.
+    """
+
+    def submit(self, fn, /, *args, **kwargs) -> Future:
+        return super().submit(copy_context().run, fn, *args, **kwargs)
+
+
+def percentiles(values: list[float], quantiles=(50, 90, 99)) -> dict[str, float]:
+    """
+    Percentiles of the values (linear interpolation between the closest
+    ranks), plus the max and the number of values. Empty if there are none.
+    """
+    if not values:
+        return {}
+    ordered = sorted(values)
+    result = {}
+    for q in quantiles:
+        rank = (len(ordered) - 1) * q / 100
+        low = int(rank)
+        high = min(low + 1, len(ordered) - 1)
+        result[f"p{q}"] = ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+    result["max"] = ordered[-1]
+    result["count"] = len(ordered)
+    return result
+
+
+def summarize_runs(runs: list[dict]) -> dict:
+    """
+    Percentiles of the durations, stages and counters of some refresh runs,
+    overall and for every provider (the slowest providers first).
+    """
+    providers: dict[str, dict] = {}
+    for run in runs:
+        for result in run.get("providers", []):
+            provider = providers.setdefault(
+                result["provider_name"],
+                {
+                    "statuses": {},
+                    "duration": [],
+                    "stages": {},
+                    "backends": [],
+                    "bytes_fetched": [],
+                    "errors": 0,
+                },
+            )
+            status = result.get("status")
+            provider["statuses"][status] = provider["statuses"].get(status, 0) + 1
+            for field in ("duration", "backends", "bytes_fetched"):
+                if result.get(field) is not None:
+                    provider[field].append(result[field])
+            for name, seconds in result.get("stages", {}).items():
+                provider["stages"].setdefault(name, []).append(seconds)
+            provider["errors"] += result.get("counts", {}).get("errors", 0)
+
+    run_stages: dict[str, list[float]] = {}
+    for run in runs:
+        for name, seconds in run.get("stages", {}).items():
+            run_stages.setdefault(name, []).append(seconds)
+
+    summary = {
+        name: {
+            "statuses": provider["statuses"],
+            "duration": percentiles(provider["duration"]),
+            "stages": {
+                stage: percentiles(values)
+                for stage, values in provider["stages"].items()
+            },
+            "backends": percentiles(provider["backends"]),
+            "bytes_fetched": percentiles(provider["bytes_fetched"]),
+            "errors": provider["errors"],
+        }
+        for name, provider in providers.items()
+    }
+    durations = [run["duration"] for run in runs if run.get("duration") is not None]
+    return {
+        "runs": len(runs),
+        "duration": percentiles(durations),
+        "stages": {name: percentiles(values) for name, values in run_stages.items()},
+        "providers": dict(
+            sorted(
+                summary.items(),
+                key=lambda item: item[1]["duration"].get("p90", 0),
+                reverse=True,
+            )
+        ),
+    }
@@ -1,24 +1,77 @@
+import math
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from typing import Callable
+
 from bson import ObjectId
+from dotenv import dotenv_values
 from fastapi.logger import logger
-from modules.source_files.braket_ws_pricing import get_pricing
+from pymongo import DeleteMany, ReplaceOne, UpdateMany, UpdateOne
+from pymongo.errors import DuplicateKeyError
+from modules.source_files.braket_ws_pricing import braket_pricing, get_pricing
+from utils.circuit_breaker import CircuitOpenError
+from utils.leader_lease import leader_lease, leader_only
+from utils.metrics import REFRESH_PROVIDERS_QUEUED
+from utils.refresh_telemetry import (
+    STAGE_DB_WRITE,
+    STAGE_PRICING,
+    RefreshTelemetry,
+    recording,
+    stage,
+)
 from utils.utils import get_current_datetime
 from database.models.providers_models import BaseProviderModel, ThirdPartyEnum
-from modules.gateway_module import fetch_data
-from database.provider_data import providers_data
+from database.backend_cache import invalidate_catalog
+from database.schemas.backend_schema import (
+    VOLATILE_FIELDS,
+    get_backend_hashes,
+    hash_fields,
+)
+from database.models.refresh_models import ProviderRefreshResult, RefreshRunModel
+from modules.gateway_module import (
+    TIER_FULL,
+    TIER_STATUS,
+    fetch_data,
+    fetch_status,
+    provider_circuit,
+)
+from database.provider_data import get_providers_data, providers_data
 from database.scripts.extra_data import get_extra_data
 from database.mongo_client import (
+    db_aggregate_providers,
+    db_bulk_write_backends,
+    db_bulk_write_providers,
     db_delete_backends,
     db_delete_providers,
     db_find_backends,
-    db_find_provider,
     db_find_providers,
-    db_insert_backends,
+    db_find_refresh_run,
     db_insert_providers,
-    db_update_backends,
-    db_update_provider,
+    db_insert_refresh_run,
     db_update_providers,
+    db_update_refresh_run,
 )
-from apscheduler.schedulers.background import BackgroundScheduler
+
+env = {
+    **dotenv_values(),
+    **os.environ
+}
+
+# Numero maximo de proveedores que se refrescan a la vez
+REFRESH_CONCURRENCY = int(env.get("REFRESH_CONCURRENCY", 4))
+# Tiempo maximo (en segundos) que se espera al refresco de un proveedor
+REFRESH_PROVIDER_TIMEOUT = float(env.get("REFRESH_PROVIDER_TIMEOUT", 300))
+# Cada cuantos minutos se refresca el estado y la cola de los backends
+LIVE_STATUS_INTERVAL = int(env.get("LIVE_STATUS_INTERVAL", 5))
+# Tiempo maximo (en segundos) para refrescar el estado de un proveedor
+LIVE_STATUS_TIMEOUT = float(env.get("LIVE_STATUS_TIMEOUT", 60))
+# Segundos de retraso con los que aun se ejecuta un trabajo que no se pudo
+# ejecutar a su hora (p.ej. porque la app estaba parada)
+JOB_MISFIRE_GRACE_TIME = int(env.get("JOB_MISFIRE_GRACE_TIME", 60 * 60))
 
 
 def job_manager(event):
@@ -30,18 +83,35 @@ def job_manager(event):
 
 def post_process_providers():
     # Actualizar los ids de los proveedores de terceros
-    for third_party in [e.value for e in ThirdPartyEnum]:
-        formated_tp = third_party.lower().replace(" ", "_")
-        provider = db_find_provider(filter={"pid": f"native.{formated_tp}"})
-        db_update_providers(
-            filter={"third_party.third_party_name": third_party},
-            cambios={"$set": {"third_party.third_party_id": provider["_id"]}},
-        )
+    # - una sola consulta para obtener los ids de todas las plataformas
+    platforms = {
+        f"native.{third_party.lower().replace(' ', '_')}": third_party
+        for third_party in [e.value for e in ThirdPartyEnum]
+    }
+    native_providers = db_aggregate_providers(
+        pipeline=[
+            {"$match": {"pid": {"$in": list(platforms)}}},
+            {"$project": {"pid": 1}},
+        ]
+    )
+    db_bulk_write_providers(
+        [
+            UpdateMany(
+                {"third_party.third_party_name": platforms[provider["pid"]]},
+                {"$set": {"third_party.third_party_id": provider["_id"]}},
+            )
+            for provider in native_providers
+        ]
+    )
     # Añadir datos extra que no se pueden automatizar:
     # - descripciones
     extra_data: dict = get_extra_data()
-    for name, data in extra_data.items():
-        db_update_providers(filter={"name": name}, cambios={"$set": data})
+    db_bulk_write_providers(
+        [
+            UpdateMany({"name": name}, {"$set": data})
+            for name, data in extra_data.items()
+        ]
+    )
 
 
 def init_providers():
@@ -51,88 +121,678 @@ def init_providers():
     post_process_providers()
 
 
-def schedule_providers(scheduler: BackgroundScheduler):
-    # Reseteamos los proveedores
-    # - elimina proveedores obsoletos
-    # - obtiene proveedores nuevos
-    db_delete_providers(filter={})
-    init_providers()
+@leader_only
+def schedule_providers():
+    # Reconciliamos los proveedores con sus definiciones
+    # - actualiza los proveedores existentes, sin cambiar sus ids
+    # - añade los proveedores nuevos
+    # - retira los proveedores obsoletos (y sus backends)
+    inserted = reconcile_providers(get_providers_data())
+    if not inserted:
+        return
+
+    # Solo se obtienen ahora los backends de los proveedores nuevos,
+    # el resto se refrescan con el job diario.
+    # Los de terceros se obtienen a traves de su plataforma
+    platforms_ids = {
+        provider["third_party"]["third_party_id"]
+        if provider["from_third_party"]
+        else provider["_id"]
+        for provider in db_find_providers(filter={"_id": {"$in": inserted}})
+    }
+    providers = [
+        BaseProviderModel(**provider)
+        for provider in db_find_providers(
+            filter={"_id": {"$in": list(platforms_ids)}, "from_third_party": False}
+        )
+    ]
+    if not providers:
+        return
+    run_id, created = create_refresh_run(
+        providers, trigger="scheduler", fencing_token=leader_lease.token
+    )
+    if created:
+        execute_refresh_run(run_id, providers, fenced=True)
+
+
+def get_provider_definition(provider: dict) -> dict:
+    """
+    Fields of a provider definition to ``$set`` when reconciling,
+    leaving out the ones filled at runtime (backends, third party id...)
+    """
+    definition = {
+        **{
+            field: value
+            for field, value in provider.items()
+            if field not in ["_id", "backends_ids", "third_party"]
+        },
+        # Los datos extra se incluyen ya, para no sobrescribirlos temporalmente
+        **get_extra_data().get(provider["name"], {}),
+    }
+    for field, value in (provider.get("third_party") or {}).items():
+        if field != "third_party_id":
+            definition[f"third_party.{field}"] = value
+    return definition
+
+
+def reconcile_providers(definitions: list[dict]) -> list[ObjectId]:
+    """
+    Brings the stored providers in line with their definitions, matching
+    them by ``pid``: existing ones are updated in place (keeping their ids
+    and backends), new ones are inserted and the ones no longer defined are
+    deleted along with their backends.
+
+    Returns:
+    - list[ObjectId]: The ids of the inserted providers
+    """
+    pids = [provider["pid"] for provider in definitions]
+    result = db_bulk_write_providers(
+        [
+            UpdateOne(
+                {"pid": provider["pid"]},
+                {
+                    "$set": get_provider_definition(provider),
+                    "$setOnInsert": {"backends_ids": []},
+                },
+                upsert=True,
+            )
+            for provider in definitions
+        ]
+    )
+    inserted = list(result.upserted_ids.values()) if result else []
+
+    retired = list(
+        db_find_providers(
+            filter={"pid": {"$nin": pids}}, projection={"pid": 1, "backends_ids": 1}
+        )
+    )
+    if retired:
+        retired_ids = [provider["_id"] for provider in retired]
+        backends_ids = [
+            backend_id
+            for provider in retired
+            for backend_id in provider.get("backends_ids") or []
+        ]
+        db_delete_backends(
+            filter={
+                "$or": [
+                    {"_id": {"$in": backends_ids}},
+                    {"provider.provider_id": {"$in": retired_ids}},
+                ]
+            }
+        )
+        db_delete_providers(filter={"_id": {"$in": retired_ids}})
+        # Los proveedores que los ofrecian dejan de referenciarlos
+        db_update_providers(
+            filter={"backends_ids": {"$in": backends_ids}},
+            cambios={"$pull": {"backends_ids": {"$in": backends_ids}}},
+        )
+        invalidate_catalog()
+    logger.info(
+        f"Providers reconciled: {len(definitions) - len(inserted)} updated, "
+        f"{len(inserted)} inserted, {len(retired)} retired "
+        f"({', '.join(provider['pid'] for provider in retired) or '-'})"
+    )
+
+    if inserted:
+        # Los proveedores nuevos necesitan los ids de sus plataformas
+        post_process_providers()
+    return inserted
+
+
+def get_name_terms(name: str) -> set[str]:
+    """Words of a name, split like the text search of MongoDB does"""
+    return set(re.findall(r"[^\W_]+", name.lower()))
+
 
-    # Delete all backends
-    db_delete_backends(filter={})
-    # Multihilo
-    init_backends(scheduler)
+def get_pricing_bids(backends: list[dict], precios: list[dict]) -> dict[int, list[str]]:
+    """
+    Map every pricing entry (by its position) to the bids of the backends
+    whose name contains any of the words of its ``qpu_family``.
+    If several entries match a backend, the last one wins.
+    """
+    family_terms = [get_name_terms(system["qpu_family"]) for system in precios]
+    pricing_bids: dict[int, list[str]] = {}
+    for backend in backends:
+        terms = get_name_terms(backend.get("backend_name") or "")
+        matches = [i for i, family in enumerate(family_terms) if family & terms]
+        if matches and backend.get("price") != precios[matches[-1]]["price"]:
+            pricing_bids.setdefault(matches[-1], []).append(backend["bid"])
+    return pricing_bids
 
 
 def post_process_backends():
+    """
+    Adds the data that can't be fetched with the backends (prices).
+    Runs once per refresh cycle, after every provider has been refreshed.
+    """
     # Añadir datos extra que no se pueden automatizar:
     # - precios
     precios: list = get_pricing()
-    for system in precios:
-        db_update_backends(
-            filter={"$text": {"$search": system["qpu_family"]}},
-            cambios={"$set": {"price": system["price"]}},
-        )
+    backends = db_find_backends(projection={"bid": 1, "backend_name": 1, "price": 1})
+    pricing_bids = get_pricing_bids(list(backends), precios)
+    operations = [
+        UpdateMany({"bid": {"$in": bids}}, {"$set": {"price": precios[i]["price"]}})
+        for i, bids in sorted(pricing_bids.items())
+    ]
+    if operations:
+        db_bulk_write_backends(operations, ordered=True)
+        invalidate_catalog()
+    logger.debug(f"Prices set on {sum(map(len, pricing_bids.values()))} backends")
 
 
-def refresh_backends(provider: BaseProviderModel):
+def refresh_backends(
+    provider: BaseProviderModel, cancel_event: threading.Event = None
+) -> int:
     """
     Refreshes the backends of a provider
 
     Args:
     - provider (BaseProviderModel): The provider to refresh
         - id (str): The provider's database id
-    """
-    # Borramos los backends antiguos
-    old_ids = list(map(lambda id: ObjectId(id), provider.backends_ids))
-    db_delete_backends(filter={"_id": {"$in": old_ids}})
-
-    # Borramos las referencias a los backends antiguos
-    db_update_providers(
-        filter={"backends_ids": {"$in": old_ids}},
-        cambios={"$set": {"backends_ids": []}},
-    )
+    - cancel_event (threading.Event, optional): If set before the new data
+    is stored (e.g. the refresh timed out), nothing is written
 
-    # Obtenemos los nuevos backends
-    datos = fetch_data(provider)
+    Returns:
+    - int: The number of backends stored
+    """
+    # Obtenemos los nuevos backends antes de tocar los antiguos,
+    # asi un fallo o un timeout no deja al proveedor sin backends
+    datos, errores = fetch_data(provider, cancel_event)
     if not datos:
+        if errores:
+            raise ValueError(f"No backend could be normalized: {errores[0]}")
         # Si no hay datos por lo que sea, terminamos, no podemos insertar nada
-        return
-    backends_ids = db_insert_backends(datos)
+        return 0
+    if cancel_event and cancel_event.is_set():
+        logger.warning(f"Refresh of {provider.name} cancelled, discarding its data")
+        return 0
+
+    # Si algun backend no se ha podido normalizar, los datos estan incompletos:
+    # no se elimina ningun backend y los ids se añaden en lugar de sustituirse
+    with stage(STAGE_DB_WRITE):
+        return store_backends(provider, datos, partial=bool(errores))
+
 
+def store_backends(
+    provider: BaseProviderModel, datos: list[dict], *, partial: bool
+) -> int:
+    """
+    Stores the fetched backends of a provider, and links them to the provider
+    (and to the providers offered through it, if it is a third party).
+    If ``partial``, the backends that were not fetched are kept.
+
+    Returns:
+    - int: The number of backends stored
+    """
+    backends_ids = reconcile_backends(provider, datos, keep_missing=partial)
+
+    operations = []
     # Si el proveedor es de terceros, hay que actualizar los proveedores que ofrece
     if provider.pid.split(".")[1] in [e.value.lower() for e in ThirdPartyEnum]:
-
-        # Obtenemos los backends asociados
-        for backend in db_find_backends(filter={"_id": {"$in": backends_ids}}):
-            # Si el nombre coincide, y proviene de terceros, se añade el id del backend
-            db_update_provider(
-                filter={
-                    "name": backend["provider"]["provider_name"],
-                    "from_third_party": True,
-                },
-                cambios={
-                    "$push": {"backends_ids": backend["_id"]},
-                    "$set": {"last_checked": get_current_datetime()},
-                },
+        ids_by_bid = dict(zip([backend["bid"] for backend in datos], backends_ids))
+        offered: dict[str, list[ObjectId]] = {}
+        for backend in datos:
+            offered.setdefault(backend["provider"]["provider_name"], []).append(
+                ids_by_bid[backend["bid"]]
+            )
+        # Si el nombre coincide, y proviene de terceros, se fijan sus backends
+        operations += [
+            UpdateOne(
+                {"name": provider_name, "from_third_party": True},
+                backends_ids_update(offered_ids, partial=partial),
             )
+            for provider_name, offered_ids in offered.items()
+        ]
 
     # Para el resto de proveedores, se actualiza la lista de ids de backends
-    db_update_provider(
-        filter={"_id": ObjectId(provider.id)},
-        cambios={
-            "$set": {
-                "backends_ids": backends_ids,
-                "last_checked": get_current_datetime(),
-            }
-        },
+    operations.append(
+        UpdateOne(
+            {"_id": ObjectId(provider.id)},
+            backends_ids_update(backends_ids, partial=partial),
+        )
     )
-    post_process_backends()
+    # Todos los proveedores se actualizan de una vez
+    db_bulk_write_providers(operations)
+    return len(backends_ids)
+
+
+def backends_ids_update(ids: list[ObjectId], *, partial: bool) -> dict:
+    """
+    Update that sets the ``backends_ids`` of a provider,
+    or just adds them if the fetched backends were incomplete (``partial``)
+    """
+    now = get_current_datetime()
+    if partial:
+        return {
+            "$addToSet": {"backends_ids": {"$each": ids}},
+            "$set": {"last_checked": now},
+        }
+    return {"$set": {"backends_ids": ids, "last_checked": now}}
 
 
-def init_backends(scheduler: BackgroundScheduler):
+def reconcile_backends(
+    provider: BaseProviderModel, datos: list[dict], *, keep_missing: bool = False
+) -> list[ObjectId]:
+    """
+    Stores the fetched backends of a provider, writing only what changed.
+
+    Backends are matched by ``bid``: new ones are inserted, the ones whose
+    static fields changed are replaced, the ones where only the volatile
+    fields changed get just those fields updated, and the unchanged ones
+    are not touched. Backends that disappeared are deleted, unless
+    ``keep_missing`` is set (``datos`` is known to be incomplete).
+
+    Returns:
+    - list[ObjectId]: The ids of the provider's backends, in the order of ``datos``
+    """
+    old_ids = list(map(lambda id: ObjectId(id), provider.backends_ids or []))
+    bids = [backend["bid"] for backend in datos]
+    stored: dict[str, dict] = {
+        backend["bid"]: backend
+        for backend in db_find_backends(
+            filter={"$or": [{"_id": {"$in": old_ids}}, {"bid": {"$in": bids}}]},
+            projection={"bid": 1, "hashes": 1},
+        )
+    }
+
+    operations = []
+    counts = {"inserted": 0, "replaced": 0, "updated": 0, "unchanged": 0}
+    for backend in datos:
+        backend["hashes"] = get_backend_hashes(backend)
+        old_hashes: dict = stored.get(backend["bid"], {}).get("hashes", {})
+        if backend["bid"] not in stored:
+            counts["inserted"] += 1
+            operations.append(ReplaceOne({"bid": backend["bid"]}, backend, upsert=True))
+        elif old_hashes.get("static") != backend["hashes"]["static"]:
+            counts["replaced"] += 1
+            operations.append(ReplaceOne({"bid": backend["bid"]}, backend))
+        elif old_hashes.get("volatile") != backend["hashes"]["volatile"]:
+            counts["updated"] += 1
+            volatile = {
+                field: backend[field] for field in VOLATILE_FIELDS if field in backend
+            }
+            volatile.update(
+                {
+                    "hashes.volatile": backend["hashes"]["volatile"],
+                    "last_checked": backend["last_checked"],
+                }
+            )
+            operations.append(UpdateOne({"bid": backend["bid"]}, {"$set": volatile}))
+        else:
+            counts["unchanged"] += 1
+
+    gone = [] if keep_missing else [bid for bid in stored if bid not in bids]
+    if gone:
+        gone_ids = [ObjectId(stored[bid]["_id"]) for bid in gone]
+        operations.append(DeleteMany({"bid": {"$in": gone}}))
+        # Los proveedores dejan de referenciar los backends eliminados
+        db_update_providers(
+            filter={"backends_ids": {"$in": gone_ids}},
+            cambios={"$pull": {"backends_ids": {"$in": gone_ids}}},
+        )
+    if operations:
+        db_bulk_write_backends(operations)
+        invalidate_catalog()
+    logger.debug(f"Backends of {provider.name}: {counts}, deleted: {len(gone)}")
+
+    ids_by_bid = {
+        backend["bid"]: backend["_id"]
+        for backend in db_find_backends(
+            filter={"bid": {"$in": bids}}, projection={"bid": 1}
+        )
+    }
+    return [ids_by_bid[bid] for bid in bids]
+
+
+def refresh_backends_status(
+    provider: BaseProviderModel, cancel_event: threading.Event = None
+) -> int:
+    """
+    Refreshes only the volatile fields (status, queue...) of the backends
+    of a provider, patching them in place. Backends that are not stored yet
+    are left to the full refresh.
+
+    Args:
+    - provider (BaseProviderModel): The provider to refresh
+    - cancel_event (threading.Event, optional): If set before the new data
+    is stored (e.g. the refresh timed out), nothing is written
+
+    Returns:
+    - int: The number of backends updated
+    """
+    statuses = fetch_status(provider, cancel_event)
+    if not statuses:
+        return 0
+    if cancel_event and cancel_event.is_set():
+        logger.warning(f"Status refresh of {provider.name} cancelled")
+        return 0
+
+    with stage(STAGE_DB_WRITE):
+        stored: dict[str, dict] = {
+            backend["bid"]: backend
+            for backend in db_find_backends(
+                filter={"bid": {"$in": [status["bid"] for status in statuses]}},
+                projection={"bid": 1, **{field: 1 for field in VOLATILE_FIELDS}},
+            )
+        }
+
+    operations = []
+    for status in statuses:
+        if (old := stored.get(status["bid"])) is None:
+            continue
+        changes = {
+            field: value
+            for field, value in status.items()
+            if field in VOLATILE_FIELDS and old.get(field) != value
+        }
+        if not changes:
+            continue
+        changes.update(
+            {
+                "hashes.volatile": hash_fields({**old, **changes}, VOLATILE_FIELDS),
+                "last_checked": status["last_checked"],
+            }
+        )
+        operations.append(UpdateOne({"bid": status["bid"]}, {"$set": changes}))
+    if operations:
+        with stage(STAGE_DB_WRITE):
+            db_bulk_write_backends(operations)
+        invalidate_catalog()
+    return len(operations)
+
+
+@leader_only
+def init_backends():
     providers = db_find_providers(filter={"from_third_party": False})
     providers = list(map(lambda p: BaseProviderModel(**p), providers))
-    for provider in providers:
-        logger.info(f"Processing provider: {provider.name} with id: {provider.id}...")
-        scheduler.add_job(func=refresh_backends, args=[provider], id=provider.name)
+    run_id, created = create_refresh_run(
+        providers, trigger="scheduler", fencing_token=leader_lease.token
+    )
+    if not created:
+        logger.info(f"Backends already being refreshed by run {run_id}")
+        return
+    execute_refresh_run(run_id, providers, fenced=True)
+
+
+@leader_only
+def init_live_status():
+    providers = db_find_providers(
+        filter={
+            "from_third_party": False,
+            "backend_request.module.status_func": {"$ne": None},
+        }
+    )
+    providers = list(map(lambda p: BaseProviderModel(**p), providers))
+    refresh_providers(
+        providers,
+        timeout=LIVE_STATUS_TIMEOUT,
+        refresh_func=refresh_backends_status,
+    )
+
+
+@leader_only
+def refresh_pricing():
+    # Se refrescan antes de caducar, para que el refresco de los backends
+    # (y las peticiones) no tengan que esperar al scrapeo
+    if braket_pricing.revalidate(ahead=braket_pricing.ttl / 2):
+        logger.debug("Pricing refreshed")
+
+
+# region Refresh engine ----------------------------
+
+
+def refresh_provider(
+    provider: BaseProviderModel,
+    result: ProviderRefreshResult,
+    *,
+    timeout: float,
+    on_update: Callable[[ProviderRefreshResult], None] = None,
+    refresh_func: Callable[[BaseProviderModel, threading.Event], int] = None,
+):
+    """
+    Refreshes a single provider with a hard timeout.
+
+    The refresh runs in its own daemon thread. If it doesn't finish in time
+    it is cancelled (its data is discarded) and the slot is released,
+    so a hung upstream call can't hold back the rest of the providers.
+    """
+    cancel_event = threading.Event()
+    outcome: dict = {}
+    telemetry = RefreshTelemetry()
+
+    def target():
+        # Las etapas del refresco se miden en el hilo que lo ejecuta
+        with recording(telemetry):
+            try:
+                outcome["backends"] = refresh_func(provider, cancel_event=cancel_event)
+            except Exception as error:
+                outcome["error"] = error
+
+    logger.info(f"Processing provider: {provider.name} with id: {provider.id}...")
+    result.status = "running"
+    result.started_at = get_current_datetime()
+    if on_update:
+        on_update(result)
+
+    start = time.perf_counter()
+    worker = threading.Thread(
+        target=target, name=f"refresh-{provider.pid}", daemon=True
+    )
+    worker.start()
+    worker.join(timeout)
+
+    if worker.is_alive():
+        cancel_event.set()
+        result.status = "timeout"
+        result.error = f"Refresh did not finish in {timeout} seconds"
+        # Un proveedor que no responde cuenta como fallo para su circuit breaker
+        tier = TIER_STATUS if refresh_func is refresh_backends_status else TIER_FULL
+        provider_circuit(provider, tier).record_failure(TimeoutError(result.error))
+    elif isinstance(error := outcome.get("error"), CircuitOpenError):
+        # Se conservan sus ultimos backends, no se ha escrito nada
+        result.status = "skipped"
+        result.error = str(error)
+    elif error:
+        result.status = "error"
+        result.error = f"{type(error).__name__}: {error}"
+    else:
+        result.status = "ok"
+        result.backends = outcome.get("backends", 0)
+    result.duration = time.perf_counter() - start
+    # Si el refresco sigue en curso (timeout), lo medido hasta ahora
+    result.stages = dict(telemetry.stages)
+    result.counts = dict(telemetry.counts)
+    result.bytes_fetched = telemetry.bytes_fetched
+    result.errors = list(telemetry.errors)
+
+    if result.status == "skipped":
+        logger.warning(f"Refresh of {provider.name} skipped: {result.error}")
+    elif result.status != "ok":
+        logger.error(
+            f"Refresh of {provider.name} failed ({result.status}): {result.error}"
+        )
+    if on_update:
+        on_update(result)
+
+
+def refresh_providers(
+    providers: list[BaseProviderModel],
+    *,
+    concurrency: int = None,
+    timeout: float = None,
+    on_update: Callable[[ProviderRefreshResult], None] = None,
+    refresh_func: Callable[[BaseProviderModel, threading.Event], int] = None,
+) -> list[ProviderRefreshResult]:
+    """
+    Refreshes the backends of several providers concurrently.
+
+    Args:
+    - providers (list[BaseProviderModel]): The providers to refresh
+    - concurrency (int, optional): Max providers refreshed at once.
+    Defaults to ``REFRESH_CONCURRENCY``
+    - timeout (float, optional): Seconds allowed for each provider.
+    Defaults to ``REFRESH_PROVIDER_TIMEOUT``
+    - on_update (Callable, optional): Called every time a provider
+    changes its status
+    - refresh_func (Callable, optional): What to refresh of each provider.
+    Defaults to ``refresh_backends`` (the full refresh)
+
+    Returns:
+    - list[ProviderRefreshResult]: The result of every provider
+    """
+    concurrency = concurrency or REFRESH_CONCURRENCY
+    timeout = timeout or REFRESH_PROVIDER_TIMEOUT
+    refresh_func = refresh_func or refresh_backends
+    results = [
+        ProviderRefreshResult(provider_id=provider.id, provider_name=provider.name)
+        for provider in providers
+    ]
+    if not providers:
+        return results
+
+    def run(provider: BaseProviderModel, result: ProviderRefreshResult):
+        REFRESH_PROVIDERS_QUEUED.dec()
+        refresh_provider(
+            provider,
+            result,
+            timeout=timeout,
+            on_update=on_update,
+            refresh_func=refresh_func,
+        )
+
+    REFRESH_PROVIDERS_QUEUED.inc(len(providers))
+    with ThreadPoolExecutor(
+        max_workers=min(concurrency, len(providers)), thread_name_prefix="refresh"
+    ) as executor:
+        futures = [
+            executor.submit(run, provider, result)
+            for provider, result in zip(providers, results)
+        ]
+    for future in futures:
+        if error := future.exception():
+            logger.error(f"Refresh engine error: {error}")
+    return results
+
+
+# region Refresh runs ----------------------------
+
+
+def get_run_key(providers: list[BaseProviderModel]) -> str:
+    """Identifies a set of providers, regardless of their order"""
+    return ",".join(sorted(provider.id for provider in providers))
+
+
+def create_refresh_run(
+    providers: list[BaseProviderModel], *, trigger: str, fencing_token: int = None
+) -> tuple[str, bool]:
+    """
+    Registers a new refresh run, unless one for the same providers is in flight.
+    The check is atomic across workers: only one run per key can be "running"
+    (unique partial index ``key_running_unique``).
+
+    Returns:
+    - tuple[str, bool]: The id of the run and whether it was created (``False``
+    if an existing run was joined instead)
+    """
+    key = get_run_key(providers)
+    # Lo maximo que puede tardar el refresco completo, tras eso se da por perdido
+    waves = math.ceil(len(providers) / REFRESH_CONCURRENCY)
+    # Como mucho: choca con uno abandonado, se cierra, y se vuelve a intentar
+    for _ in range(3):
+        now = get_current_datetime()
+        refresh_run = RefreshRunModel(
+            key=key,
+            trigger=trigger,
+            providers=[
+                ProviderRefreshResult(provider_id=p.id, provider_name=p.name)
+                for p in providers
+            ],
+            created_at=now,
+            expires_at=now + timedelta(seconds=waves * REFRESH_PROVIDER_TIMEOUT + 60),
+            fencing_token=fencing_token,
+        )
+        try:
+            run_id = db_insert_refresh_run(refresh_run.model_dump(exclude={"id"}))
+            return str(run_id), True
+        except DuplicateKeyError:
+            running = db_find_refresh_run(
+                filter={"key": key, "status": "running"},
+                projection={"_id": 1, "expires_at": 1},
+            )
+        if running is None:
+            # Acaba de terminar, se vuelve a intentar
+            continue
+        if running["expires_at"] > now:
+            return str(running["_id"]), False
+        logger.warning(f"Refresh run {running['_id']} abandoned, starting a new one")
+        db_update_refresh_run(
+            filter={"_id": running["_id"], "status": "running"},
+            cambios={"$set": {"status": "abandoned", "finished_at": now}},
+        )
+    raise RuntimeError(f"Could not create a refresh run for {key}")
+
+
+def execute_refresh_run(
+    run_id: str, providers: list[BaseProviderModel], *, fenced: bool = False
+):
+    """
+    Runs the refresh engine, recording the progress of every provider in the run.
+    If ``fenced``, the run belongs to the leader and its last stage is skipped
+    if the leadership was lost meanwhile.
+    """
+
+    def on_update(result: ProviderRefreshResult):
+        db_update_refresh_run(
+            filter={
+                "_id": ObjectId(run_id),
+                "providers.provider_id": result.provider_id,
+            },
+            cambios={"$set": {"providers.$": result.model_dump()}},
+        )
+
+    start = time.perf_counter()
+    telemetry = RefreshTelemetry()
+    try:
+        refresh_providers(providers, on_update=on_update)
+        if fenced and not leader_lease.check():
+            logger.warning(f"Leadership lost during refresh run {run_id}")
+            return
+        # Los precios se aplican una sola vez, con todos los proveedores ya refrescados
+        try:
+            with recording(telemetry), stage(STAGE_PRICING):
+                post_process_backends()
+        except Exception as e:
+            logger.error(f"Error setting the prices of the backends: {e}")
+    finally:
+        db_update_refresh_run(
+            filter={"_id": ObjectId(run_id)},
+            cambios={
+                "$set": {
+                    "status": "finished",
+                    "finished_at": get_current_datetime(),
+                    "duration": time.perf_counter() - start,
+                    "stages": telemetry.stages,
+                }
+            },
+        )
+
+
+def start_refresh_run(
+    providers: list[BaseProviderModel], *, trigger: str = "api"
+) -> tuple[str, bool]:
+    """
+    Starts a refresh run in the background (or joins the one in flight).
+
+    Returns:
+    - tuple[str, bool]: The id of the run and whether it was created
+    """
+    run_id, created = create_refresh_run(providers, trigger=trigger)
+    if created:
+        threading.Thread(
+            target=execute_refresh_run,
+            args=(run_id, providers),
+            name=f"refresh-run-{run_id}",
+            daemon=True,
+        ).start()
+    return run_id, created
@@ -1,5 +1,8 @@
 import ast
+import os
+import socket
 import time
+import uuid
 from datetime import datetime
 from pathlib import Path
 
@@ -10,6 +13,9 @@ from passlib.context import CryptContext
 
 # region Miscelaneous
 
+# Identifica a este proceso (p.ej. como dueño de un lease)
+PROCESS_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
 
 def sf_parse_object_id(id: str | int) -> ObjectId:
     """
@@ -142,6 +148,13 @@ def check_code(file_path: Path):
         return False
     with open(file_path, encoding="utf-8") as f:
         code = f.read()
+    return check_source(code)
+
+
+def check_source(code: str):
+    """
+    Parse and check source code before executing it (see ``check_code``).
+    """
     try:
         parse_code(code)
     except Exception as e:
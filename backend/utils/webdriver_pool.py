@@ -0,0 +1,182 @@
+"""
+Pool de sesiones de Chrome (headless) compartido por todos los scrapers.
+
+Arrancar Chrome es lo mas costoso de un scrapeo, asi que las sesiones se
+reutilizan:
+- Como mucho ``WEBDRIVER_POOL_SIZE`` sesiones abiertas a la vez
+- Al devolver una sesion se limpia su estado (cookies, storage, pestañas)
+- Antes de reutilizar una sesion se comprueba que sigue respondiendo
+- Las sesiones se reciclan tras ``WEBDRIVER_MAX_USES`` usos
+- Las sesiones sin usar durante ``WEBDRIVER_IDLE_TIMEOUT`` segundos se cierran
+  (lo comprueba un hilo de cada proceso)
+"""
+
+import os
+import threading
+import time
+
+from dotenv import dotenv_values
+from fastapi.logger import logger
+from selenium import webdriver
+from selenium.common.exceptions import WebDriverException
+
+env = {
+    **dotenv_values(),
+    **os.environ
+}
+
+WEBDRIVER_POOL_SIZE = int(env.get("WEBDRIVER_POOL_SIZE", 2))
+WEBDRIVER_MAX_USES = int(env.get("WEBDRIVER_MAX_USES", 20))
+WEBDRIVER_IDLE_TIMEOUT = float(env.get("WEBDRIVER_IDLE_TIMEOUT", 300))
+# Tiempo maximo (en segundos) que se espera a que quede una sesion libre
+WEBDRIVER_ACQUIRE_TIMEOUT = float(env.get("WEBDRIVER_ACQUIRE_TIMEOUT", 120))
+
+
+class PooledDriver:
+    """A Chrome session and its usage"""
+
+    def __init__(self, driver: webdriver.Chrome):
+        self.driver = driver
+        self.uses = 0
+        self.released_at = time.monotonic()
+
+
+class WebDriverPool:
+    """Bounded pool of reusable headless Chrome sessions"""
+
+    def __init__(
+        self,
+        *,
+        max_size: int = WEBDRIVER_POOL_SIZE,
+        max_uses: int = WEBDRIVER_MAX_USES,
+        idle_timeout: float = WEBDRIVER_IDLE_TIMEOUT,
+        acquire_timeout: float = WEBDRIVER_ACQUIRE_TIMEOUT,
+    ):
+        self.max_uses = max_uses
+        self.idle_timeout = idle_timeout
+        self.acquire_timeout = acquire_timeout
+        # Un hueco por cada sesion que puede estar abierta
+        self.slots = threading.BoundedSemaphore(max_size)
+        self.idle: list[PooledDriver] = []
+        self.lock = threading.Lock()
+        self.eviction_thread: threading.Thread = None
+
+    def create(self) -> PooledDriver:
+        self.start_eviction()
+        options = webdriver.ChromeOptions()
+        options.add_argument("--headless=new")  # Para ejecutar en modo sin ventana
+        options.add_argument("--disable-dev-shm-usage")
+        logger.debug("Starting a new webdriver")
+        # Sin espera implicita: cada scraper espera explicitamente lo que necesita
+        return PooledDriver(webdriver.Chrome(options=options))
+
+    @staticmethod
+    def quit(pooled: PooledDriver):
+        try:
+            pooled.driver.quit()
+        except WebDriverException as e:
+            logger.warning(f"Error closing a webdriver: {e}")
+
+    @staticmethod
+    def is_healthy(pooled: PooledDriver) -> bool:
+        """Whether the session still responds"""
+        try:
+            pooled.driver.execute_script("return 1")
+            return True
+        except WebDriverException:
+            return False
+
+    @staticmethod
+    def reset(pooled: PooledDriver):
+        """Leaves the session as new, with a single blank tab"""
+        driver = pooled.driver
+        for handle in driver.window_handles[1:]:
+            driver.switch_to.window(handle)
+            driver.close()
+        driver.switch_to.window(driver.window_handles[0])
+        driver.delete_all_cookies()
+        try:
+            driver.execute_script(
+                "window.localStorage.clear(); window.sessionStorage.clear();"
+            )
+        except WebDriverException:
+            # Las paginas como 'about:blank' no tienen storage
+            pass
+        driver.get("about:blank")
+
+    def acquire(self) -> PooledDriver:
+        """
+        Get an idle healthy session, or start a new one.
+        :raises TimeoutError: if no session is free in ``acquire_timeout`` seconds
+        """
+        if not self.slots.acquire(timeout=self.acquire_timeout):
+            raise TimeoutError("No webdriver available")
+        try:
+            self.evict_idle()
+            while True:
+                with self.lock:
+                    pooled = self.idle.pop() if self.idle else None
+                if pooled is None:
+                    return self.create()
+                if self.is_healthy(pooled):
+                    return pooled
+                logger.warning("Discarding an unresponsive webdriver")
+                self.quit(pooled)
+        except Exception:
+            self.slots.release()
+            raise
+
+    def release(self, pooled: PooledDriver):
+        """Give back a session, recycling it if it is worn out or broken"""
+        try:
+            pooled.uses += 1
+            if pooled.uses >= self.max_uses:
+                logger.debug(f"Recycling a webdriver after {pooled.uses} uses")
+                self.quit(pooled)
+                return
+            try:
+                self.reset(pooled)
+            except WebDriverException:
+                self.quit(pooled)
+                return
+            pooled.released_at = time.monotonic()
+            with self.lock:
+                self.idle.append(pooled)
+        finally:
+            self.slots.release()
+
+    def evict_idle(self):
+        """Close the sessions that have been idle for too long"""
+        now = time.monotonic()
+        with self.lock:
+            expired = [p for p in self.idle if now - p.released_at > self.idle_timeout]
+            self.idle = [p for p in self.idle if p not in expired]
+        for pooled in expired:
+            logger.debug("Closing an idle webdriver")
+            self.quit(pooled)
+
+    def start_eviction(self):
+        """Close idle sessions periodically, from the first session on"""
+        with self.lock:
+            if self.eviction_thread is not None:
+                return
+            self.eviction_thread = threading.Thread(
+                target=self.run_eviction, name="webdriver-eviction", daemon=True
+            )
+        self.eviction_thread.start()
+
+    def run_eviction(self):
+        while True:
+            time.sleep(min(60, self.idle_timeout))
+            self.evict_idle()
+
+    def close(self):
+        """Close every idle session"""
+        with self.lock:
+            idle, self.idle = self.idle, []
+        for pooled in idle:
+            self.quit(pooled)
+
+
+# Pool compartido por todo el proceso
+webdriver_pool = WebDriverPool()